@@ -0,0 +1,158 @@
+from concurrent.futures import ThreadPoolExecutor
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "main"))
+
+from groq_stub import add_config_arguments, config_from_arguments, start_stub_server
+
+CHAT_QUESTIONS = [
+    "Can they share my personal data with third parties?",
+    "How do I cancel my account?",
+    "Are there any fees I should know about?",
+    "What happens if I break these terms?",
+]
+
+
+def percentiles(samples):
+    if not samples:
+        return "n/a"
+    samples = sorted(samples)
+    return "  ".join(f"p{q}={samples[min(len(samples) - 1, int(len(samples) * q / 100))]:.3f}s"
+                     for q in (50, 95, 99))
+
+
+def timed(function, *args, **kwargs):
+    # (result, seconds to the first streamed token, total seconds)
+    start = time.perf_counter()
+    first_token = []
+    def on_token(delta):
+        if not first_token:
+            first_token.append(time.perf_counter() - start)
+    result = function(*args, on_token=on_token, **kwargs)
+    return result, first_token[0] if first_token else None, time.perf_counter() - start
+
+
+def summary_benchmark(documents, requests, concurrency, hedge):
+    from api_summary import generate_api_summary, hedge_policy
+
+    def run(i):
+        return timed(generate_api_summary, documents[i % len(documents)],
+                     hedge=hedge_policy if hedge else None)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = list(pool.map(run, range(requests)))
+
+    failed = sum(1 for summary, _, _ in results if summary.startswith("Cannnot generate") or summary == "api_error")
+    print(f"summaries: {requests} requests, {failed} failed")
+    print(f"  first token  {percentiles([first for _, first, _ in results if first is not None])}")
+    print(f"  total        {percentiles([total for _, _, total in results])}")
+    if hedge:
+        print(f"  hedging      {hedge_policy.report()}")
+
+
+def chat_session(document, questions):
+    # The chatbot's flow without the UI: index the document's clauses, then one
+    # streamed reply per question carrying the excerpts that match it
+    from api_summary import router, stream_completion
+    from chat_history import ChatHistory
+    from rate_limiter import DEFAULT_QUOTA, MODEL_QUOTAS, limiter
+    from retrieval import CHAT_MAX_TOKENS, CHAT_MODELS, CHAT_PROMPT, MIN_REPLY_TOKENS, ChunkIndex, question_messages
+    from token_budget import completion_budget, request_tokens
+
+    client = router.get_client()
+    index = ChunkIndex(document)
+    history = ChatHistory({"role": "system", "content": CHAT_PROMPT})
+    turns = []
+    for question in questions:
+        question = {"role": "user", "content": question}
+        messages = question_messages(history.messages() + [question], index)
+        model = limiter.choose_model(CHAT_MODELS, request_tokens(messages, CHAT_MAX_TOKENS))
+        quota = MODEL_QUOTAS.get(model, DEFAULT_QUOTA)[1]
+        max_tokens = completion_budget(model, messages, CHAT_MAX_TOKENS, request_limit=quota)
+        estimated_tokens = request_tokens(messages, max_tokens)
+        if max_tokens < MIN_REPLY_TOKENS or not limiter.acquire(model, estimated_tokens):
+            turns.append((None, None, None))
+            continue
+        try:
+            (reply, usage), first, total = timed(
+                lambda on_token: stream_completion(client, on_token, model=model, messages=messages,
+                                                   max_tokens=max_tokens))
+        except Exception:
+            turns.append((None, None, None))
+            continue
+        if usage is not None:
+            limiter.settle(model, estimated_tokens, usage.total_tokens)
+        # Question and answer enter the history together, as in the app's ChatTurn
+        history.append(question)
+        history.append({"role": "assistant", "content": reply.strip()})
+        turns.append((first, total, request_tokens(messages, 0)))
+    history.close()
+    return turns
+
+
+def chat_benchmark(documents, sessions, turns, concurrency):
+    questions = [CHAT_QUESTIONS[i % len(CHAT_QUESTIONS)] for i in range(turns)]
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        results = [turn for session in pool.map(lambda i: chat_session(documents[i % len(documents)], questions),
+                                                range(sessions))
+                   for turn in session]
+
+    answered = [turn for turn in results if turn[0] is not None]
+    print(f"chat: {sessions} sessions, {len(results)} turns, {len(results) - len(answered)} failed")
+    print(f"  first token  {percentiles([first for first, _, _ in answered])}")
+    print(f"  total        {percentiles([total for _, total, _ in answered])}")
+    if answered:
+        print(f"  prompt tokens  first turn {answered[0][2]}, max {max(tokens for _, _, tokens in answered)}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the abstractive summary and chat paths "
+                                                 "against the local Groq stand-in")
+    add_config_arguments(parser)
+    parser.add_argument("--requests", type=int, default=20, help="summaries to generate")
+    parser.add_argument("--chat-sessions", type=int, default=5)
+    parser.add_argument("--chat-turns", type=int, default=12, help="questions per chat")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--hedge", action="store_true", help="hedge summary requests")
+    parser.add_argument("--unlimited", action="store_true", help="lift the client-side rate limits")
+    parser.add_argument("--sample-dir", default=os.path.join(BASE_DIR, "Sample T&Cs"))
+    args = parser.parse_args()
+
+    server = start_stub_server(config_from_arguments(args))
+    os.environ["GROQ_BASE_URL"] = server.base_url
+    os.environ.setdefault("GROQ_API_KEY", "stub")
+
+    import api_summary
+    from database import Database
+    from rate_limiter import limiter
+
+    # A fresh response cache, so every request reaches the server
+    api_summary._cache_db = Database(os.path.join(tempfile.mkdtemp(), "cache.db"), check_same_thread=False)
+    if args.unlimited:
+        limiter.quotas = {model: (10 ** 6, 10 ** 9) for model, _ in api_summary.MODELS}
+
+    documents = []
+    for path in sorted(glob.glob(os.path.join(args.sample_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as file:
+            documents.append(file.read())
+
+    start = time.perf_counter()
+    if args.requests:
+        summary_benchmark(documents, args.requests, args.concurrency, args.hedge)
+    if args.chat_sessions:
+        chat_benchmark(documents, args.chat_sessions, args.chat_turns, args.concurrency)
+
+    stats = server.stats
+    print(f"server: {stats.requests} requests ({stats.streamed} streamed), errors {stats.errors}, "
+          f"{stats.cancelled} streams cancelled, {time.perf_counter() - start:.1f}s")
+    server.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,207 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from threading import Lock, Thread
+import argparse
+import json
+import os
+import random
+import sys
+import time
+import uuid
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "main"))
+
+from token_budget import count_tokens
+
+COMPLETIONS_PATH = "/openai/v1/chat/completions"  # the groq SDK appends this to GROQ_BASE_URL
+FILLER_WORDS = ("the service may collect use and share your data with partners subject to "
+                "these terms which can change at any time without notice").split()
+
+
+class StubConfig:
+    # Behaviour of the stand-in API. Time to first token is lognormal around
+    # latency_median (per-model overrides in model_latency); tokens then stream
+    # at tokens_per_second
+    def __init__(self, latency_median=0.4, latency_sigma=0.5, model_latency=None, tokens_per_second=600.0,
+                 output_tokens=300, rate_429=0.0, rate_5xx=0.0, retry_after=2.0, seed=None):
+        self.latency_median = latency_median
+        self.latency_sigma = latency_sigma
+        self.model_latency = dict(model_latency or {})  # model -> median seconds to first token
+        self.tokens_per_second = tokens_per_second
+        self.output_tokens = output_tokens  # completion length, capped by the request's max_tokens
+        self.rate_429 = rate_429            # share of requests answered with 429 Too Many Requests
+        self.rate_5xx = rate_5xx            # share of requests answered with 503
+        self.retry_after = retry_after
+        self.random = random.Random(seed)
+        self.lock = Lock()
+
+    def draw(self, model):
+        # (status, seconds to first token) for one request
+        with self.lock:
+            roll = self.random.random()
+            median = self.model_latency.get(model, self.latency_median)
+            latency = median * self.random.lognormvariate(0, self.latency_sigma)
+        if roll < self.rate_429:
+            return 429, 0.0
+        if roll < self.rate_429 + self.rate_5xx:
+            return 503, latency
+        return 200, latency
+
+
+class StubStats:
+    def __init__(self):
+        self.requests = 0
+        self.streamed = 0
+        self.errors = {}
+        self.cancelled = 0  # streams the client closed before the end
+        self.lock = Lock()
+
+    def count(self, field, status=None):
+        with self.lock:
+            if status is not None:
+                self.errors[status] = self.errors.get(status, 0) + 1
+            else:
+                setattr(self, field, getattr(self, field) + 1)
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_POST(self):
+        server = self.server
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path != COMPLETIONS_PATH:
+            return self.send_json(404, {"error": {"message": f"Unknown path {self.path}", "type": "not_found"}})
+
+        server.stats.count("requests")
+        model = body.get("model", "")
+        status, latency = server.config.draw(model)
+        if status == 429:
+            server.stats.count("errors", status)
+            return self.send_json(429, {"error": {"message": f"Rate limit reached for model {model}",
+                                                  "type": "tokens", "code": "rate_limit_exceeded"}},
+                                  {"retry-after": str(server.config.retry_after)})
+        time.sleep(latency)
+        if status != 200:
+            server.stats.count("errors", status)
+            return self.send_json(status, {"error": {"message": "Service Unavailable", "type": "internal_server_error"}})
+
+        prompt_tokens = sum(count_tokens(message.get("content") or "") for message in body.get("messages", []))
+        completion_tokens = min(server.config.output_tokens, body.get("max_tokens") or server.config.output_tokens)
+        words = [FILLER_WORDS[i % len(FILLER_WORDS)] for i in range(completion_tokens)]
+        usage = {"prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens,
+                 "total_tokens": prompt_tokens + completion_tokens}
+        response_id = f"chatcmpl-{uuid.uuid4().hex}"
+
+        if body.get("stream"):
+            server.stats.count("streamed")
+            self.stream(response_id, model, words, usage)
+        else:
+            time.sleep(completion_tokens / server.config.tokens_per_second)
+            self.send_json(200, {
+                "id": response_id, "object": "chat.completion", "created": int(time.time()), "model": model,
+                "choices": [{"index": 0, "message": {"role": "assistant", "content": " ".join(words)},
+                             "finish_reason": "stop", "logprobs": None}],
+                "usage": usage,
+            })
+
+    def send_json(self, status, payload, headers=None):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream(self, response_id, model, words, usage):
+        # Server-sent events in the chat.completion.chunk format, usage in the last chunk's x_groq
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def chunk(delta, finish_reason=None, x_groq=None):
+            payload = {"id": response_id, "object": "chat.completion.chunk", "created": int(time.time()),
+                       "model": model, "choices": [{"index": 0, "delta": delta, "finish_reason": finish_reason}]}
+            if x_groq is not None:
+                payload["x_groq"] = x_groq
+            self.wfile.write(f"data: {json.dumps(payload)}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        try:
+            chunk({"role": "assistant", "content": ""}, x_groq={"id": response_id})
+            interval = 1 / self.server.config.tokens_per_second
+            for i, word in enumerate(words):
+                chunk({"content": word if i == 0 else " " + word})
+                time.sleep(interval)
+            chunk({}, "stop", {"id": response_id, "usage": usage})
+            self.wfile.write(b"data: [DONE]\n\n")
+            self.wfile.flush()
+        except (BrokenPipeError, ConnectionResetError):
+            self.server.stats.count("cancelled")
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, config=None, host="127.0.0.1", port=0):
+        super().__init__((host, port), StubHandler)
+        self.config = config or StubConfig()
+        self.stats = StubStats()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+
+def start_stub_server(config=None, host="127.0.0.1", port=0):
+    # Serve in a background thread; point the app at it with GROQ_BASE_URL=server.base_url
+    server = StubServer(config, host, port)
+    Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def parse_model_latency(values):
+    # ["llama3-8b-8192=2.0", ...] -> {"llama3-8b-8192": 2.0}
+    return {model: float(median) for model, median in (value.split("=", 1) for value in values)}
+
+
+def add_config_arguments(parser):
+    parser.add_argument("--latency-median", type=float, default=0.4, help="median seconds to first token")
+    parser.add_argument("--latency-sigma", type=float, default=0.5, help="lognormal sigma of the latency")
+    parser.add_argument("--model-latency", action="append", default=[], metavar="MODEL=SECONDS",
+                        help="median latency for one model")
+    parser.add_argument("--tokens-per-second", type=float, default=600.0)
+    parser.add_argument("--output-tokens", type=int, default=300)
+    parser.add_argument("--rate-429", type=float, default=0.0, help="share of requests rejected with 429")
+    parser.add_argument("--rate-5xx", type=float, default=0.0, help="share of requests failing with 503")
+    parser.add_argument("--retry-after", type=float, default=2.0)
+    parser.add_argument("--seed", type=int, default=None)
+
+
+def config_from_arguments(args):
+    return StubConfig(args.latency_median, args.latency_sigma, parse_model_latency(args.model_latency),
+                      args.tokens_per_second, args.output_tokens, args.rate_429, args.rate_5xx,
+                      args.retry_after, args.seed)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local Groq-compatible chat completions stand-in")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    add_config_arguments(parser)
+    args = parser.parse_args()
+
+    server = StubServer(config_from_arguments(args), args.host, args.port)
+    print(f"Serving on {server.base_url} (set GROQ_BASE_URL to this and GROQ_API_KEY to anything)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
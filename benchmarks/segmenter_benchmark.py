@@ -0,0 +1,51 @@
+import glob
+import os
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "main"))
+
+from nltk import sent_tokenize
+from regex import compile as compile_pattern
+
+from segmenter import segment
+
+# Sentences that are only a clause number or section letter ("1.", "A.") mean a mis-split heading
+BARE_MARKER_PATTERN = compile_pattern(r"^\(?(\d+(\.\d+)*|[A-Za-z]|[ivxIVX]+)[.)]?$")
+
+
+def best_time(function, text, repeat=5):
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(text)
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main(sample_dir=os.path.join(BASE_DIR, "Sample T&Cs")):
+    print(f"{'document':<16}{'chars':>8}{'punkt s':>10}{'ours s':>10}{'speedup':>9}"
+          f"{'punkt n':>9}{'ours n':>8}{'punkt bad':>11}{'ours bad':>10}")
+    total_punkt = total_ours = 0
+
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+
+        punkt_time, punkt_sentences = best_time(sent_tokenize, text)
+        our_time, our_sentences = best_time(segment, text)
+        total_punkt += punkt_time
+        total_ours += our_time
+
+        punkt_bad = sum(1 for s in punkt_sentences if BARE_MARKER_PATTERN.match(s.strip()))
+        our_bad = sum(1 for s in our_sentences if BARE_MARKER_PATTERN.match(s.strip()))
+        print(f"{os.path.basename(path):<16}{len(text):>8}{punkt_time:>10.4f}{our_time:>10.4f}"
+              f"{punkt_time / our_time:>8.1f}x{len(punkt_sentences):>9}{len(our_sentences):>8}"
+              f"{punkt_bad:>11}{our_bad:>10}")
+
+    print(f"{'total':<16}{'':>8}{total_punkt:>10.4f}{total_ours:>10.4f}{total_punkt / total_ours:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main(*sys.argv[1:])
@@ -0,0 +1,62 @@
+import glob
+import os
+import random
+import sys
+import time
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(BASE_DIR, "main"))
+
+from token_budget import count_tokens
+
+CHUNK_LENGTHS = (200, 1000, 5000)  # characters per random excerpt
+
+
+def load_tokenizer(path=None):
+    # A model's tokenizer.json (e.g. from the Llama 3 or Gemma 2 repo) if given,
+    # otherwise tiktoken's cl100k_base, whose splits are close to Llama 3's
+    if path:
+        from tokenizers import Tokenizer
+        tokenizer = Tokenizer.from_file(path)
+        return lambda text: len(tokenizer.encode(text, add_special_tokens=False).ids)
+
+    import tiktoken
+    encoding = tiktoken.get_encoding("cl100k_base")
+    return lambda text: len(encoding.encode(text, disallowed_special=()))
+
+
+def main(tokenizer_path=None, sample_dir=os.path.join(BASE_DIR, "Sample T&Cs"), samples=3000):
+    reference = load_tokenizer(tokenizer_path)
+    documents = []
+
+    print(f"{'document':<16}{'chars':>8}{'tokens':>8}{'ours':>8}{'ratio':>7}{'chars/1.2':>11}{'ours s':>9}")
+    for path in sorted(glob.glob(os.path.join(sample_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+        documents.append(text)
+
+        start = time.perf_counter()
+        estimate = count_tokens(text)
+        elapsed = time.perf_counter() - start
+        actual = reference(text)
+        print(f"{os.path.basename(path):<16}{len(text):>8}{actual:>8}{estimate:>8}{estimate / actual:>7.3f}"
+              f"{len(text) / 1.2 / actual:>10.2f}x{elapsed:>9.4f}")
+
+    # Chunks are what map-reduce actually sends, so check the spread on excerpts too
+    random.seed(0)
+    ratios = []
+    for _ in range(int(samples)):
+        text = random.choice(documents)
+        start = random.randrange(len(text))
+        excerpt = text[start:start + random.choice(CHUNK_LENGTHS)]
+        if len(excerpt) >= 100:
+            ratios.append(count_tokens(excerpt) / reference(excerpt))
+
+    ratios.sort()
+    percentiles = "  ".join(f"p{int(q * 100)}={ratios[int(len(ratios) * q)]:.3f}" for q in (0.01, 0.05, 0.5, 0.95, 0.99))
+    print(f"excerpt estimate/actual: {percentiles}")
+
+
+if __name__ == "__main__":
+    # python token_estimator_calibration.py [tokenizer.json] [sample_dir]
+    main(*sys.argv[1:])
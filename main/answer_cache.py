@@ -0,0 +1,89 @@
+from collections import OrderedDict
+from hashlib import sha256
+from threading import Lock
+
+from nltk.stem import PorterStemmer
+from regex import compile as compile_pattern
+from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS, HashingVectorizer
+
+MAX_ENTRIES = 500             # answers kept across all documents
+SIMILARITY_THRESHOLD = 0.85   # cosine between question vectors that counts as the same question
+
+WORD_PATTERN = compile_pattern(r"\p{L}+|\p{N}+")
+
+_stemmer = PorterStemmer()
+
+
+def question_terms(question):
+    # "How do I cancel my subscriptions?" -> ["cancel", "subscript"]
+    return [_stemmer.stem(word) for word in WORD_PATTERN.findall(question.lower()) if word not in ENGLISH_STOP_WORDS]
+
+
+# Stateless, so vectors from different chats and documents are comparable
+_vectorizer = HashingVectorizer(analyzer=question_terms, alternate_sign=False, norm='l2')
+
+
+def document_key(text):
+    return sha256(text.encode("utf-8")).hexdigest()
+
+
+class AnswerCache:
+    # Chat answers per document, looked up by question similarity so rephrasings of a
+    # question already answered for the same T&C skip the model; least recently used
+    # answers are evicted beyond max_entries
+    def __init__(self, max_entries=MAX_ENTRIES, threshold=SIMILARITY_THRESHOLD):
+        self.max_entries = max_entries
+        self.threshold = threshold
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = OrderedDict()  # (document key, question terms) -> (vector, answer), oldest first
+        self._documents = {}           # document key -> set of its entry keys
+        self._lock = Lock()
+
+    def get(self, document, question):
+        vector = _vectorizer.transform([question])
+        with self._lock:
+            best_key, best_similarity = None, 0.0
+            if vector.nnz:
+                for key in self._documents.get(document, ()):
+                    similarity = vector.multiply(self._entries[key][0]).sum()
+                    if similarity > best_similarity:
+                        best_key, best_similarity = key, similarity
+
+            if best_key is None or best_similarity < self.threshold:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._entries.move_to_end(best_key)
+            return self._entries[best_key][1]
+
+    def put(self, document, question, answer):
+        vector = _vectorizer.transform([question])
+        if not vector.nnz or not answer:
+            return
+        key = (document, " ".join(sorted(set(question_terms(question)))))
+        with self._lock:
+            self._entries[key] = (vector, answer)
+            self._entries.move_to_end(key)
+            self._documents.setdefault(document, set()).add(key)
+            while len(self._entries) > self.max_entries:
+                old_key, _ = self._entries.popitem(last=False)
+                self._documents[old_key[0]].discard(old_key)
+                if not self._documents[old_key[0]]:
+                    del self._documents[old_key[0]]
+                self.evictions += 1
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+            }
+
+
+answer_cache = AnswerCache()
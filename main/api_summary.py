@@ -1,45 +1,348 @@
-from groq import Groq
-import os
+from concurrent.futures import ThreadPoolExecutor
+from hashlib import sha256
+from threading import Condition, Event
+import json
+import time
 
-def run_model(text,summ_model):
-    api_key = os.getenv("GROQ_API_KEY")
-    if not api_key:
+from database import Database
+from model_router import HedgePolicy, ModelRouter
+from rate_limiter import MAX_QUEUE_WAIT, MODEL_QUOTAS, RateLimitExceeded, limiter
+from token_budget import chunk_spans, count_tokens, input_budget, request_tokens, truncate_to_tokens
+
+SUMMARY_PROMPT = "Generate only the abstractive summary of these terms and conditions capturing every small detail. Don't include disclaimers."
+REDUCE_PROMPT = ("These are summaries of consecutive sections of one terms and conditions document. "
+                 "Combine them into a single abstractive summary capturing every small detail. Don't include disclaimers.")
+
+MAX_CONCURRENT_CHUNKS = 4  # chunk requests in flight at once
+CHUNK_QUOTA_SHARE = 0.5    # largest request as a share of a model's tokens-per-minute quota
+SUMMARY_MAX_TOKENS = 2048  # completion tokens reserved for every summary request
+TEMPERATURE = 0.5
+TOP_P = 1
+
+# (model, input limit in tokens), in preference order; a request has to fit the context
+# window and leave most of a minute's token quota for the other chunks in flight, which
+# queue for the rest (sized for the longer reduce prompt)
+MODELS = [
+    (model, input_budget(model, REDUCE_PROMPT, SUMMARY_MAX_TOKENS,
+                         request_limit=int(MODEL_QUOTAS[model][1] * CHUNK_QUOTA_SHARE)))
+    for model in ("llama3-8b-8192", "llama-3.1-8b-instant", "gemma2-9b-it")
+]
+
+router = ModelRouter(MODELS, limiter=limiter)
+hedge_policy = HedgePolicy(router)
+
+_cache_db = None
+
+def get_cache_db():
+    # One connection for the response cache, shared by the chunk worker threads
+    global _cache_db
+    if _cache_db is None:
+        _cache_db = Database(check_same_thread=False)
+    return _cache_db
+
+
+def cache_key(summ_model, system_prompt, text, temperature=TEMPERATURE, top_p=TOP_P, base_url=None,
+              max_tokens=SUMMARY_MAX_TOKENS):
+    # Responses from another endpoint (e.g. a local stub server) are never reused
+    base_url = router.base_url() if base_url is None else base_url
+    request = json.dumps([base_url, summ_model, system_prompt, text, temperature, top_p, max_tokens])
+    return sha256(request.encode("utf-8")).hexdigest()
+
+
+def stream_completion(client, on_token, **request):
+    # Run a chat completion with stream=True, passing every text delta to on_token;
+    # returns the full text and the token usage reported in the final chunk
+    content, usage = [], None
+    stream = client.chat.completions.create(stream=True, **request)
+    try:
+        for chunk in stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                delta = chunk.choices[0].delta.content
+                content.append(delta)
+                on_token(delta)
+            x_groq = getattr(chunk, "x_groq", None)
+            if getattr(x_groq, "usage", None) is not None:
+                usage = x_groq.usage
+    finally:
+        # Drops the connection if on_token gave up on the stream part way
+        if hasattr(stream, "close"):
+            stream.close()
+    return "".join(content), usage
+
+
+def run_model(text,summ_model,system_prompt=SUMMARY_PROMPT,on_token=None,queue_timeout=MAX_QUEUE_WAIT,cancel=None,
+              max_tokens=SUMMARY_MAX_TOKENS):
+    # Identical requests are answered from the cache without touching the network;
+    # queue_timeout is how long to wait for quota (None: until there is some)
+    key = cache_key(summ_model, system_prompt, text, max_tokens=max_tokens)
+    cached = get_cache_db().get_cached_response(key)
+    if cached is not None:
+        if on_token is not None:
+            on_token(cached)
+        return cached
+
+    client = router.get_client()
+    if client is None:
         return "api_error"
-        
-    client = Groq(api_key=api_key)
-    completion = client.chat.completions.create(
+
+    messages = [
+        {"role": "system", "content": system_prompt},
+        {"role": "user", "content": text}
+    ]
+
+    # Wait for this model's quota, or give up and let the caller try the next model.
+    # Either way this is the client pacing itself, not a failure of the model
+    estimated_tokens = request_tokens(messages, max_tokens)
+    if not limiter.acquire(summ_model, estimated_tokens, queue_timeout, cancel):
+        if cancel is not None and cancel.is_set():
+            raise RequestCancelled()
+        raise RateLimitExceeded(summ_model)
+    if cancel is not None and cancel.is_set():
+        limiter.settle(summ_model, estimated_tokens, 0)  # cancelled as the quota came free
+        raise RequestCancelled()
+
+    request = dict(
         model=summ_model,
-        messages=[
-            {"role": "system", "content": "Generate only the abstractive summary of these terms and conditions capturing every small detail. Don't include disclaimers."},
-            {"role": "user", "content": text}
-        ],
-        temperature=0.5,
-         # Adjust as needed to control summary length
-        top_p=1,
-        stream=False
+        messages=messages,
+        temperature=TEMPERATURE,
+        max_tokens=max_tokens,  # Adjust as needed to control summary length
+        top_p=TOP_P,
     )
+    start = time.monotonic()
+    first_token = []
+    def on_delta(delta):
+        if not first_token:
+            first_token.append(time.monotonic() - start)
+        on_token(delta)
+
+    try:
+        if on_token is not None:
+            summary, usage = stream_completion(client, on_delta, **request)
+        else:
+            completion = client.chat.completions.create(stream=False, **request)
+            summary, usage = completion.choices[0].message.content, getattr(completion, "usage", None)
+    except RequestCancelled as e:
+        # Dropped part way: only the prompt was spent, so give back the reserved completion
+        limiter.settle(summ_model, estimated_tokens, request_tokens(messages, 0))
+        if isinstance(e, HedgeCancelled):
+            # Lost a hedged race: slower than the winner, so a slow sample rather than none,
+            # or a primary that keeps losing would stay ranked first
+            router.record_abandoned(summ_model, time.monotonic() - start)
+        # Neither that nor a cancel by the user says anything about the model's health
+        raise
+    except Exception as e:
+        router.record_failure(summ_model, e)
+        raise
+    router.record_success(summ_model, time.monotonic() - start, first_token[0] if first_token else None)
+    if usage is not None:
+        limiter.settle(summ_model, estimated_tokens, usage.total_tokens)
     # db.add_query(summ_model)
 
-    return completion.choices[0].message.content
+    if summary:
+        get_cache_db().add_cached_response(key, summ_model, summary)
+    return summary
+
 
+class RequestCancelled(Exception):
+    pass
 
-def generate_api_summary(text):
 
-    models_list =[
-    ("llama3-8b-8192", 30000),
-    ("llama-3.1-8b-instant", 20000),
-    ("gemma2-9b-it", 15000)
-    ]
+class HedgeCancelled(RequestCancelled):
+    pass
+
+
+class AnyEvent:
+    # Reads as set once any of its Events is set; enough for run_model and the limiter,
+    # which only poll is_set()
+    def __init__(self, *events):
+        self.events = [event for event in events if event is not None]
+
+    def is_set(self):
+        return any(event.is_set() for event in self.events)
+
+
+class HedgeRace:
+    # Copies of one request sent to several models: the first to start answering wins.
+    # The others are cancelled at once if still queued for quota, or else when their
+    # next token arrives
+    def __init__(self, on_token=None):
+        self.on_token = on_token
+        self.winner = None
+        self._lost = {}  # model -> Event set when another attempt wins
+        self._condition = Condition()
+
+    def attempt(self, model, cancel=None):
+        # Cancel flag for one attempt: set when it loses the race or cancel is set
+        with self._condition:
+            lost = self._lost.setdefault(model, Event())
+            if self.winner is not None and self.winner != model:
+                lost.set()
+        return AnyEvent(lost, cancel)
+
+    def claim(self, model):
+        with self._condition:
+            if self.winner is None:
+                self.winner = model
+                for other, lost in self._lost.items():
+                    if other != model:
+                        lost.set()
+                self._condition.notify_all()
+            return self.winner == model
+
+    def relay(self, model):
+        # on_token for one attempt: only the winner's tokens reach the caller
+        def on_delta(delta):
+            if not self.claim(model):
+                raise HedgeCancelled(model)
+            if self.on_token is not None:
+                self.on_token(delta)
+        return on_delta
+
+    def finished(self, model, future):
+        # An attempt that returned without streaming (e.g. an empty answer) still answered
+        if not future.cancelled() and future.exception() is None:
+            self.claim(model)
+        with self._condition:
+            self._condition.notify_all()
+
+    def wait(self, futures, timeout=None):
+        # Block until an attempt wins, every attempt has failed, or timeout passes
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while self.winner is None and not all(future.done() for future in futures):
+                remaining = None if deadline is None else deadline - time.monotonic()
+                if remaining is not None and remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+            return self.winner
+
+
+def run_hedged(text, models, system_prompt=SUMMARY_PROMPT, on_token=None, policy=hedge_policy,
+               queue_timeout=MAX_QUEUE_WAIT, cancel=None):
+    # Send the request to models[0]; whenever the latest attempt has not started answering
+    # within the policy's delay (or has failed), also send it to the next model. The first
+    # response is used and the rest are abandoned. Only models[0] waits up to queue_timeout
+    # for quota: a hedge is only worth sending to a model that can take it now
+    race = HedgeRace(on_token)
+    pool = ThreadPoolExecutor(max_workers=len(models))
+    attempts = []
+    hedged = set()  # models sent a copy while an earlier attempt was still running
+    try:
+        for model in models:
+            if any(not future.done() for future in attempts):
+                hedged.add(model)
+            attempt_cancel = race.attempt(model, cancel)
+            if attempts:
+                future = pool.submit(run_model, text, model, system_prompt, race.relay(model), cancel=attempt_cancel)
+            else:
+                future = pool.submit(run_model, text, model, system_prompt, race.relay(model), queue_timeout,
+                                     attempt_cancel)
+            future.add_done_callback(lambda future, model=model: race.finished(model, future))
+            attempts.append(future)
+            if len(attempts) < len(models) and race.wait(attempts, policy.delay(model)) is not None:
+                break
+
+        winner = race.wait(attempts)
+        policy.record(len(hedged), winner in hedged)
+        if winner is None:
+            # Every attempt failed: surface the last error
+            return attempts[-1].result()
+        return attempts[models.index(winner)].result()
+    finally:
+        # Losers still queued for quota drop out on their own; ones waiting for their first
+        # token stop when it arrives
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def chunk_text(text, limit):
+    # Split on clause boundaries into chunks of at most limit tokens
+    return [text[start:end] for start, end in chunk_spans(text, limit)]
+
+
+def map_reduce_summary(text, summ_model, limit, max_workers=MAX_CONCURRENT_CHUNKS, on_token=None,
+                       hedge_models=(), hedge=None, progress=None, cancel=None):
+    # Summarize chunks concurrently (map), then summarize the joined partial
+    # summaries (reduce) until they fit into a single request; only that last
+    # request is streamed to on_token. With a hedge policy, slow requests are also
+    # sent to hedge_models. Requests queue for summ_model's quota for as long as it
+    # takes, so a long document is paced to the tokens-per-minute limit instead of
+    # failing once the chunks in flight have used it up
+    system_prompt = SUMMARY_PROMPT
+    models = [summ_model] + list(hedge_models)[:hedge.max_hedges] if hedge is not None else [summ_model]
+    progress = progress or (lambda stage: None)
+
+    def request(chunk, system_prompt, on_token=None):
+        if cancel is not None and cancel.is_set():
+            raise RequestCancelled()
+        if len(models) > 1:
+            return run_hedged(chunk, models, system_prompt, on_token, hedge, queue_timeout=None, cancel=cancel)
+        return run_model(chunk, summ_model, system_prompt, on_token, queue_timeout=None, cancel=cancel)
+
+    while count_tokens(text) > limit:
+        chunks = chunk_text(text, limit)
+        done = []
+        def map_chunk(chunk):
+            partial = request(chunk, system_prompt)
+            done.append(chunk)
+            progress(f"Summarized {len(done)} of {len(chunks)} sections")
+            return partial
+
+        progress(f"Summarizing {len(chunks)} sections")
+        with ThreadPoolExecutor(max_workers=min(max_workers, len(chunks))) as pool:
+            partials = list(pool.map(map_chunk, chunks))
+
+        if "api_error" in partials:
+            return "api_error"
+
+        reduced = "\n\n".join(partials)
+        if len(reduced) >= len(text):
+            # The partial summaries did not shrink: keep what fits rather than loop
+            reduced = truncate_to_tokens(reduced, limit)
+        text = reduced
+        system_prompt = REDUCE_PROMPT
+
+    progress("Writing the summary")
+    return request(text, system_prompt, on_token)
+
+
+def generate_api_summary(text, map_reduce=True, on_token=None, hedge=None, progress=None, cancel=None):
+    # on_token, if given, receives the summary text incrementally as it streams in;
+    # hedge, a HedgePolicy (e.g. hedge_policy), turns on hedged requests; progress
+    # receives stage descriptions; setting the cancel Event stops the summary at the
+    # next request or streamed token with RequestCancelled
 
     summary = "Cannnot generate summary at this moment, Try again in a minute."
 
-    for model,val in models_list:
+    if cancel is not None and on_token is not None:
+        stream_to = on_token
+        def on_token(delta):
+            if cancel.is_set():
+                raise RequestCancelled()
+            stream_to(delta)
+
+    # Quota needed by the largest single request this text can produce
+    text_tokens = count_tokens(text)
+    needed_tokens = min(text_tokens, max(limit for _, limit in MODELS)) + SUMMARY_MAX_TOKENS
+
+    # Healthiest models with quota left first; ones whose circuit is open are skipped
+    candidates = router.candidates(text_tokens, needed_tokens)
+    for i, (model, limit) in enumerate(candidates):
+        # Hedge only onto later models that fit the same chunks and have quota right now
+        hedge_models = [other for other, other_limit in candidates[i + 1:]
+                        if other_limit >= limit and limiter.wait_time(other, needed_tokens) == 0] if hedge else []
         try:
-            limit = int(val/1.2)
-            summary = run_model(text[:limit], model)
+            if map_reduce:
+                summary = map_reduce_summary(text, model, limit, on_token=on_token,
+                                             hedge_models=hedge_models, hedge=hedge, progress=progress, cancel=cancel)
+            elif hedge_models:
+                summary = run_hedged(truncate_to_tokens(text, limit), [model] + hedge_models[:hedge.max_hedges],
+                                     on_token=on_token, policy=hedge, cancel=cancel)
+            else:
+                summary = run_model(truncate_to_tokens(text, limit), model, on_token=on_token, cancel=cancel)
             break
+        except RequestCancelled:
+            raise
         except Exception:
             pass
 
     return summary
-
@@ -1,22 +1,28 @@
 import sys
 import os
+import multiprocessing
+from threading import Event
 from PyQt5.QtWidgets import (
     QApplication, QMainWindow, QWidget, QVBoxLayout, QHBoxLayout,
     QLabel, QTextEdit, QPushButton, QToolButton, QFileDialog, QStackedWidget, QSpacerItem, QSizePolicy, QScrollArea,QFrame, QMenu, QAction, QLineEdit, 
 )
-from PyQt5.QtGui import QIcon , QPalette, QColor
-from PyQt5.QtCore import Qt, QTimer,  QSize, QProcess, QCoreApplication, QEvent
+from PyQt5.QtGui import QIcon , QPalette, QColor, QTextCursor
+from PyQt5.QtCore import Qt, QTimer,  QSize, QProcess, QCoreApplication, QEvent, QObject, QRunnable, QThreadPool, pyqtSignal
 from PyQt5.QtWidgets import QDockWidget
 
 from docx import Document
 import fitz
-from easyocr import Reader
 
 from keyword_summary import ag_generate_summary
-from tfidf_summary import st_generate_summary
-from api_summary import generate_api_summary
+from tfidf_summary import DocumentAnalysis, answer_question, st_generate_summary
+from api_summary import generate_api_summary, hedge_policy, router, stream_completion
 from database import Database
-from groq import Groq
+from rate_limiter import MODEL_QUOTAS, DEFAULT_QUOTA, limiter
+from retrieval import CHAT_MAX_TOKENS, CHAT_MODELS, CHAT_PROMPT, MIN_REPLY_TOKENS, ChunkIndex, question_messages
+from chat_history import ChatHistory
+from answer_cache import answer_cache, document_key
+from token_budget import completion_budget, request_tokens
+from jobs import JobScheduler, StreamRenderer
 
 
 from reportlab.lib.pagesizes import A4
@@ -29,6 +35,109 @@ from reportlab.lib import colors
 import warnings
 warnings.filterwarnings("ignore", category=DeprecationWarning)
 
+FIRST_TOKEN_DEADLINE = 5000  # ms to wait for the model before showing the local answer
+
+
+class ChatTurnSignals(QObject):
+    started = pyqtSignal(int)
+    token = pyqtSignal(int, str)
+    finished = pyqtSignal(int, str)
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+
+
+class TurnCancelled(Exception):
+    pass
+
+
+class TurnFailed(Exception):
+    pass
+
+
+class ChatTurn(QRunnable):
+    """One chatbot question, answered on a worker thread and reported through signals."""
+    def __init__(self, turn_id, question, history, index, client, max_tokens, document_key=None):
+        super().__init__()
+        self.turn_id = turn_id
+        self.question = {"role": "user", "content": question}
+        self.history = history
+        self.index = index
+        self.client = client
+        self.max_tokens = max_tokens
+        self.document_key = document_key  # answers are cached per document when set
+        self.signals = ChatTurnSignals()
+        self.cancel_event = Event()
+
+    def cancel(self):
+        # Takes effect before the turn starts or at its next streamed token
+        self.cancel_event.set()
+
+    def run(self):
+        if self.cancel_event.is_set():
+            self.signals.cancelled.emit(self.turn_id)
+            return
+        self.signals.started.emit(self.turn_id)
+
+        try:
+            # Rephrasings of a question already answered for this document skip the model
+            cached = answer_cache.get(self.document_key, self.question["content"]) if self.document_key else None
+            if cached is not None:
+                assistant_response = cached
+                self.signals.token.emit(self.turn_id, assistant_response)
+            else:
+                assistant_response = self.ask_model().strip()
+        except TurnCancelled:
+            self.signals.cancelled.emit(self.turn_id)
+            return
+        except TurnFailed as e:
+            self.signals.failed.emit(self.turn_id, str(e))
+            return
+        except Exception as e:
+            self.signals.failed.emit(self.turn_id, f"Error: {str(e)}")
+            return
+
+        if cached is None and self.document_key:
+            answer_cache.put(self.document_key, self.question["content"], assistant_response)
+
+        # Question and answer enter the history together, so a failed or cancelled turn leaves no trace
+        self.history.append(self.question)
+        self.history.append({"role": "assistant", "content": assistant_response})
+        self.signals.finished.emit(self.turn_id, assistant_response)
+
+    def ask_model(self):
+        messages = question_messages(self.history.messages() + [self.question], self.index)
+
+        # Pick a chat model with quota left for this request, waiting briefly if none has
+        model = limiter.choose_model(CHAT_MODELS, request_tokens(messages, self.max_tokens))
+
+        # Size the reply to what is left of the model's context window and per-minute quota
+        quota = MODEL_QUOTAS.get(model, DEFAULT_QUOTA)[1]
+        max_tokens = completion_budget(model, messages, self.max_tokens, request_limit=quota)
+        if max_tokens < MIN_REPLY_TOKENS:
+            raise TurnFailed("This conversation is too long to continue. Start a new chat.")
+
+        estimated_tokens = request_tokens(messages, max_tokens)
+        if not limiter.acquire(model, estimated_tokens):
+            raise TurnFailed("Request limit reached. Try again in a minute.")
+
+        renderer = StreamRenderer(lambda text: self.signals.token.emit(self.turn_id, text), repaint=False)
+        def on_token(delta):
+            if self.cancel_event.is_set():
+                raise TurnCancelled()
+            renderer(delta)
+
+        assistant_response, usage = stream_completion(
+            self.client,
+            on_token,
+            model=model,
+            messages=messages,
+            max_tokens=max_tokens,
+        )
+        renderer.flush()
+        if usage is not None:
+            limiter.settle(model, estimated_tokens, usage.total_tokens)
+        return assistant_response
+
 
 class TermsSummarizerApp(QMainWindow):
     def __init__(self):
@@ -40,6 +149,18 @@ class TermsSummarizerApp(QMainWindow):
 
         self.db = Database()
         self.session_id = self.db.add_log_entry()
+
+        # Summaries run off the UI thread; results come back through these signals
+        self.jobs = JobScheduler(self)
+        self.jobs.progress.connect(self.on_summary_progress)
+        self.jobs.token.connect(self.on_summary_token)
+        self.jobs.finished.connect(self.on_summary_finished)
+        self.jobs.failed.connect(self.on_summary_failed)
+        self.jobs.cancelled.connect(self.on_summary_cancelled)
+        self.jobs.warm_up()
+        self.summary_jobs = {}  # job id -> (summary type, input text) of summaries in progress
+        self.summary_sections = {}  # summary type -> text shown for it, in request order
+        self.summary_stages = {}    # summary type -> stage of a summary still in progress
         
         
         # Apply dark theme
@@ -394,6 +515,7 @@ class TermsSummarizerApp(QMainWindow):
             "Basic": QPushButton("Basic"),
             "Specific": QPushButton("Specific"),
             "Abstractive": QPushButton("Abstractive"),
+            "All": QPushButton("All"),
         }
 
         # Set button properties and select Basic by default
@@ -421,6 +543,7 @@ class TermsSummarizerApp(QMainWindow):
             button.clicked.connect(lambda checked, b=button: self.select_summary_type(b))
             summary_type_layout.addWidget(button)
             
+        self.summary_type_buttons["All"].setToolTip("Basic, Specific and Abstractive summaries at once.")
         summary_type_layout.addStretch(1)  # Right alignment of summary type buttons
 
         # Add the attachment button at the far right
@@ -466,6 +589,19 @@ class TermsSummarizerApp(QMainWindow):
         summarize_button.clicked.connect(self.generate_summary)
         button_layout.addWidget(summarize_button)
 
+        self.cancel_summary_button = QPushButton("Cancel")
+        self.cancel_summary_button.setCursor(Qt.PointingHandCursor)
+        self.cancel_summary_button.setStyleSheet("""
+            QPushButton {
+                min-width: 120px;
+                min-height: 24px;
+                margin-right: 43px;
+            }
+        """)
+        self.cancel_summary_button.clicked.connect(self.cancel_summary)
+        self.cancel_summary_button.setVisible(False)
+        button_layout.addWidget(self.cancel_summary_button)
+
 
         centered_button_layout = QHBoxLayout()
         centered_button_layout.addStretch(1)
@@ -473,6 +609,13 @@ class TermsSummarizerApp(QMainWindow):
         centered_button_layout.addStretch(1)
         layout.addLayout(centered_button_layout)
         layout.addSpacing(15)
+
+        # Stage of the summary being generated
+        self.summary_status = QLabel()
+        self.summary_status.setAlignment(Qt.AlignCenter)
+        self.summary_status.setStyleSheet("color: #aaaaaa; font-size: 13px;")
+        self.summary_status.setVisible(False)
+        layout.addWidget(self.summary_status)
         
         # Output box for summary
         self.output_text = QTextEdit()
@@ -675,6 +818,7 @@ class TermsSummarizerApp(QMainWindow):
                     extracted_text += page.get_text()
                 pdf.close()
             elif path.lower().endswith((".png", ".jpg", ".jpeg")):
+                from easyocr import Reader  # imported here: it loads torch, which only OCR needs
                 reader = Reader(['en'])  # Specify the language(s) as needed
                 result = reader.readtext(path, detail=0)  # detail=0 for plain text output
                 extracted_text = "\n".join(result)
@@ -685,57 +829,141 @@ class TermsSummarizerApp(QMainWindow):
         self.bottom_button_layout_widget.setVisible(False)
         summary_type = getattr(self, 'selected_summary_type', "Basic")  # Default to Basic if not selected
         text = self.input_text.toPlainText()
-        final_summary = ""
 
         if not text:
             self.output_text.setPlainText("Please enter the text or attach file.")
             return
 
-        if self.selected_summary_type == "Basic":
-            try:
-                summary = st_generate_summary(text, reducing_factor= 8)  # Call the imported function
-                final_summary = summary
-            except Exception as e:
-                self.output_text.setPlainText("Something went wrong! Execption: " + str(e))
-                return
+        if summary_type == "All":
+            summary_types = ["Basic", "Specific", "Abstractive"]
+        elif summary_type in ("Basic", "Specific", "Abstractive"):
+            summary_types = [summary_type]
+        else:
+            self.output_text.setPlainText("Invalid summary type selected.")
+            return
 
-        elif self.selected_summary_type == "Specific":
-            try: 
-                summary = ag_generate_summary(text,num_sentences=4)  # Call the imported function
-                for topic, sentences in summary.items():
-                    final_summary += f"---- {topic} ----\n"
-                    for sentence in sentences:
-                        final_summary += f"- {sentence}\n"
-                    final_summary += "\n"
-
-            except Exception as e:
-                self.output_text.setPlainText("Something went wrong! Execption: " + str(e))
-                return
+        # A new request replaces the one in progress
+        self.cancel_summary()
+        self.output_text.clear()
+
+        # The extractive engines each get a worker process and the API call a thread,
+        # so "All" takes about as long as the slowest of the three
+        for summary_type in summary_types:
+            if summary_type == "Basic":
+                job_id = self.jobs.run_in_process(st_generate_summary, text, reducing_factor=8)
+            elif summary_type == "Specific":
+                job_id = self.jobs.run_in_process(ag_generate_summary, text, num_sentences=4)
+            else:
+                # Streams the summary into the output box as it is generated
+                job_id = self.jobs.run_in_thread(generate_api_summary, text, hedge=hedge_policy)
+            self.summary_jobs[job_id] = (summary_type, text)
+            self.summary_sections[summary_type] = ""
+            self.summary_stages[summary_type] = "Starting"
+
+        self.render_summary_sections()
+        self.update_summary_status()
+        self.summary_status.setVisible(True)
+        self.cancel_summary_button.setVisible(True)
+
+    def cancel_summary(self):
+        jobs, self.summary_jobs = list(self.summary_jobs), {}
+        for job_id in jobs:
+            self.jobs.cancel(job_id)
+        if jobs:
+            for summary_type in self.summary_stages:
+                self.summary_sections[summary_type] = "Summary cancelled."
+            self.render_summary_sections()
+        self.summary_sections = {}
+        self.summary_stages = {}
+        self.end_summary()
+
+    def end_summary(self):
+        if not self.summary_jobs:
+            self.summary_status.setVisible(False)
+            self.cancel_summary_button.setVisible(False)
+
+    def update_summary_status(self):
+        stages = list(self.summary_stages.items())
+        if len(stages) == 1:
+            self.summary_status.setText(f"{stages[0][1]}…")
+        else:
+            self.summary_status.setText("   ".join(f"{summary_type}: {stage}…" for summary_type, stage in stages))
 
-        elif self.selected_summary_type == "Abstractive":
-            try:
-                summary = generate_api_summary(text)  # Call the imported function
-                if summary == "api_error":
-                    self.output_text.setPlainText("API key not found. Please set the GROQ_API_KEY environment variable.")
-                    return
-                final_summary = summary
-            except Exception as e:
-                self.output_text.setPlainText("Something went wrong! Execption: " + str(e))
-                return
-            
+    def render_summary_sections(self):
+        # One summary is shown as is; several each get a heading, in the order they were requested
+        if len(self.summary_sections) == 1:
+            self.output_text.setPlainText(next(iter(self.summary_sections.values())))
+            return
+        self.output_text.setPlainText("\n".join(
+            f"==== {summary_type} ====\n{section or 'Generating…'}\n"
+            for summary_type, section in self.summary_sections.items()))
+
+    def finish_summary_section(self, job_id, section):
+        summary_type, _ = self.summary_jobs.pop(job_id)
+        self.summary_sections[summary_type] = section
+        self.summary_stages.pop(summary_type, None)
+        self.render_summary_sections()
+        self.update_summary_status()
+        self.end_summary()
+
+    def on_summary_progress(self, job_id, stage):
+        if job_id in self.summary_jobs:
+            self.summary_stages[self.summary_jobs[job_id][0]] = stage
+            self.update_summary_status()
+
+    def on_summary_token(self, job_id, text):
+        if job_id not in self.summary_jobs:
+            return
+        summary_type = self.summary_jobs[job_id][0]
+        self.summary_sections[summary_type] += text
+        if len(self.summary_sections) == 1:
+            self.append_output_text(text)
         else:
-            summary = "Invalid summary type selected."
+            self.render_summary_sections()
+
+    def on_summary_finished(self, job_id, summary):
+        if job_id not in self.summary_jobs:
+            return  # cancelled or replaced meanwhile
+        summary_type, text = self.summary_jobs[job_id]
+
+        final_summary = ""
+        if summary_type == "Specific":
+            for topic, sentences in summary.items():
+                final_summary += f"---- {topic} ----\n"
+                for sentence in sentences:
+                    final_summary += f"- {sentence}\n"
+                final_summary += "\n"
+        elif summary == "api_error":
+            self.finish_summary_section(job_id, "API key not found. Please set the GROQ_API_KEY environment variable.")
+            return
+        else:
+            final_summary = summary
 
         if len(final_summary) <= 1:
-            self.output_text.setPlainText("Not enough data to generate summary.")
+            self.finish_summary_section(job_id, "Not enough data to generate summary.")
             return
 
+        # Stored as soon as it is ready, whatever the other modes are still doing
         self.db.add_session_entry(self.session_id, summary_type, text, final_summary)
     
-        self.output_text.setPlainText(final_summary)
+        self.finish_summary_section(job_id, final_summary)
         self.bottom_button_layout_widget.setVisible(True)
         QTimer.singleShot(1000, lambda: self.update_sidebar_sessions())
 
+    def on_summary_failed(self, job_id, message):
+        if job_id in self.summary_jobs:
+            self.finish_summary_section(job_id, "Something went wrong! Execption: " + message)
+
+    def on_summary_cancelled(self, job_id):
+        # Jobs are dropped from summary_jobs when cancelled, so only an unexpected
+        # cancellation (e.g. from the scheduler) still has an entry
+        if job_id in self.summary_jobs:
+            self.finish_summary_section(job_id, "Summary cancelled.")
+
+
+    def append_output_text(self, text):
+        self.output_text.moveCursor(QTextCursor.End)
+        self.output_text.insertPlainText(text)
 
 
     def create_session_page(self, session_id, session_name):
@@ -1149,11 +1377,28 @@ class TermsSummarizerApp(QMainWindow):
             main_layout.addWidget(missing_api_key)
             return page
             
-        self.client = Groq(api_key=api_key)
+        # Share the summarizer's pooled Groq client
+        self.client = router.get_client()
 
         # Session state
-        self.chat_history = []
-        self.max_tokens = 5000
+        self.chat_history = None
+        self.chat_index = None
+        self.chat_document = ""
+        self.chat_document_key = None  # hash of the document, for the answer cache
+        self.chat_analysis = None  # sentence TF-IDF of the document, for offline answers
+        self.max_tokens = CHAT_MAX_TOKENS
+
+        # Chat turns run one at a time off the UI thread, so replies arrive in order
+        self.chat_pool = QThreadPool(self)
+        self.chat_pool.setMaxThreadCount(1)
+        self.chat_turns = {}     # turn id -> ChatTurn still queued or running
+        self.turn_bubbles = {}   # turn id -> its assistant bubble
+        self.typing_bubbles = set()  # bubbles still waiting for their first token
+        self.local_answers = {}  # turn id -> offline answer shown while the model is late
+        self.next_turn_id = 0
+        self.typing_dots = 0
+        self.typing_timer = QTimer(self)
+        self.typing_timer.timeout.connect(self.update_typing_indicator)
         
         # main_widget = QWidget(page)
         main_layout = QVBoxLayout(page)
@@ -1373,6 +1618,26 @@ class TermsSummarizerApp(QMainWindow):
         self.send_button.clicked.connect(self.send_message)
         input_layout.addWidget(self.send_button)
 
+        self.stop_button = QPushButton("Stop")
+        self.stop_button.setFixedHeight(50)
+        self.stop_button.setStyleSheet(
+            """
+            QPushButton {
+                background-color: transparent; 
+                color: #ffffff; 
+                border: none; 
+                font-size: 16px; 
+            }
+            QPushButton:hover {
+                color: #94d2bd;
+            }
+            """
+            )
+        self.stop_button.setCursor(Qt.PointingHandCursor)
+        self.stop_button.clicked.connect(self.cancel_turns)
+        self.stop_button.setVisible(False)
+        input_layout.addWidget(self.stop_button)
+
         main_layout.addWidget(self.chatbot_scroll_area, stretch=8)  # Allocate most space to the scroll area
         main_layout.addWidget(self.chatbot_input_container, stretch=1, alignment=Qt.AlignHCenter)
 
@@ -1390,7 +1655,19 @@ class TermsSummarizerApp(QMainWindow):
     
 
     def reset_chatbot_page(self):
-        self.chat_history = []
+        self.cancel_turns()
+        self.chat_turns = {}
+        self.turn_bubbles = {}
+        self.typing_bubbles = set()
+        self.local_answers = {}
+        self.typing_timer.stop()
+        if getattr(self, "chat_history", None) is not None:
+            self.chat_history.close()
+        self.chat_history = None
+        self.chat_index = None
+        self.chat_document = ""
+        self.chat_document_key = None
+        self.chat_analysis = None
     
         # Clear chat container
         for i in reversed(range(self.chat_layout.count())):
@@ -1427,19 +1704,19 @@ class TermsSummarizerApp(QMainWindow):
             self.chatbot_input_text.setText(summary)
         self.toggle_chat_visibility()
         
-        user_input = generate_api_summary(user_input)
-        # print(user_input)
-        system_message = {
-            "role": "system",
-            "content": (
-                "You must strictly limit the conversation to the provided terms and conditions. "
-                "Do not answer question that are absolutely unrelated to the provided content "
-                "Talk point to point. "
-                f"Here are the terms and conditions:\n {user_input}"
-            )
-        }
+        # Index the document's clauses; each question is sent with only the chunks that match it
+        self.chat_index = ChunkIndex(user_input)
+        # and its sentences, to answer offline when the model is slow or unreachable
+        self.chat_document = user_input
+        self.chat_document_key = document_key(user_input)
+        try:
+            self.chat_analysis = DocumentAnalysis(user_input)
+        except ValueError:
+            self.chat_analysis = None  # no usable sentences
+        system_message = {"role": "system", "content": CHAT_PROMPT}
         
-        self.chat_history.append(system_message)
+        # Bounded history: older turns are summarized in the background
+        self.chat_history = ChatHistory(system_message)
     
 
     def toggle_chat_visibility(self):
@@ -1491,40 +1768,137 @@ class TermsSummarizerApp(QMainWindow):
 
         # Display user message
         self.add_message(user_message, "user")
-        self.chat_history.append({"role": "user", "content": user_message})
 
-        # Fetch assistant response
-        self.fetch_response()
+        # Answer on the chat worker; the UI stays responsive meanwhile
+        self.start_turn(user_message)
  
  
-    def fetch_response(self):
-        try:
-            # API Call
-            response_chunks = self.client.chat.completions.create(
-                model="llama-3.1-8b-instant",
-                messages=self.chat_history,
-                max_tokens=self.max_tokens,
-                
-            )
-            # print("API Response:", response_chunks)
-                
-            assistant_response = self.generate_chat_responses(response_chunks)
-            self.chat_history.append({"role": "assistant", "content": assistant_response})
+    def start_turn(self, question):
+        turn_id = self.next_turn_id
+        self.next_turn_id += 1
+        turn = ChatTurn(turn_id, question, self.chat_history, self.chat_index, self.client, self.max_tokens,
+                        self.chat_document_key)
+        turn.signals.started.connect(self.on_turn_started)
+        turn.signals.token.connect(self.on_turn_token)
+        turn.signals.finished.connect(self.on_turn_finished)
+        turn.signals.failed.connect(self.on_turn_failed)
+        turn.signals.cancelled.connect(self.on_turn_cancelled)
+        self.chat_turns[turn_id] = turn
+        self.stop_button.setVisible(True)
+        self.chat_pool.start(turn)
+
+
+    def cancel_turns(self):
+        for turn in getattr(self, "chat_turns", {}).values():
+            turn.cancel()
+
+
+    def on_turn_started(self, turn_id):
+        if turn_id not in self.chat_turns:
+            return
+        bubble = self.add_message("typing", "assistant")
+        self.turn_bubbles[turn_id] = bubble
+        self.typing_bubbles.add(bubble)
+        self.typing_timer.start(400)
+        QTimer.singleShot(FIRST_TOKEN_DEADLINE, lambda: self.on_turn_deadline(turn_id))
+
+
+    def on_turn_deadline(self, turn_id):
+        # The model has not started answering: show the matching clauses meanwhile
+        bubble = self.turn_bubbles.get(turn_id)
+        if bubble not in self.typing_bubbles:
+            return
+        answer = self.local_answer(self.chat_turns[turn_id].question["content"])
+        if answer:
+            self.typing_bubbles.discard(bubble)
+            self.local_answers[turn_id] = answer
+            bubble.setText(f"{answer}\n\n(Waiting for the full answer...)")
+
+
+    def on_turn_token(self, turn_id, text):
+        bubble = self.turn_bubbles.get(turn_id)
+        if bubble is None:
+            return
+        if bubble in self.typing_bubbles or self.local_answers.pop(turn_id, None):
+            self.typing_bubbles.discard(bubble)
+            bubble.setText("")
+        self.append_to_bubble(bubble, text)
+
+
+    def on_turn_finished(self, turn_id, assistant_response):
+        bubble = self.turn_bubbles.get(turn_id)
+        if not self.end_turn(turn_id):
+            return
+        if bubble is not None:
+            bubble.setText(assistant_response)
+        else:
             self.add_message(assistant_response, "assistant")
-        except Exception as e:
-            self.add_message(f"Error: {str(e)}", "assistant")
 
 
-    def generate_chat_responses(self, chat_completion):
-        try:
-            content = chat_completion.choices[0].message.content
-            return content.strip() if content else ""
-        except AttributeError:
-            # Log the error for debugging
-            print("Unexpected response structure:", chat_completion)
-            raise ValueError("Invalid response format from the API.")
+    def on_turn_failed(self, turn_id, message):
+        bubble = self.turn_bubbles.get(turn_id)
+        question = self.chat_turns[turn_id].question["content"] if turn_id in self.chat_turns else ""
+        answer = self.local_answers.get(turn_id)
+        if not self.end_turn(turn_id):
+            return
+        if bubble is not None and (not bubble.text() or answer):
+            # Fall back to the clauses that match the question, if any
+            answer = answer or self.local_answer(question)
+            bubble.setText(f"{message}\n\n{answer}" if answer else message)
+        else:
+            self.add_message(message, "assistant")
+
+
+    def on_turn_cancelled(self, turn_id):
+        bubble = self.turn_bubbles.get(turn_id)
+        answer = self.local_answers.get(turn_id)
+        if not self.end_turn(turn_id):
+            return
+        if answer:
+            bubble.setText(answer)
+        elif bubble is not None and not bubble.text():
+            bubble.setText("Stopped.")
+
+
+    def local_answer(self, question):
+        # The document's sentences closest to the question, with their line numbers
+        if self.chat_analysis is None:
+            return None
+        matches = answer_question(self.chat_analysis, question)
+        if not matches:
+            return None
+        clauses = [f"• {sentence} (line {self.chat_document.count(chr(10), 0, start) + 1})"
+                   for sentence, (start, _) in matches]
+        return "Closest clauses in the document:\n" + "\n".join(clauses)
+
+
+    def end_turn(self, turn_id):
+        # Forget a finished turn; False if the chat was reset meanwhile
+        if self.chat_turns.pop(turn_id, None) is None:
+            return False
+        bubble = self.turn_bubbles.pop(turn_id, None)
+        self.local_answers.pop(turn_id, None)
+        if bubble in self.typing_bubbles:
+            self.typing_bubbles.discard(bubble)
+            bubble.setText("")
+        if not self.typing_bubbles:
+            self.typing_timer.stop()
+        if not self.chat_turns:
+            self.stop_button.setVisible(False)
+        return True
+
+
+    def update_typing_indicator(self):
+        self.typing_dots = self.typing_dots % 3 + 1
+        for bubble in self.typing_bubbles:
+            bubble.setText("typing" + "." * self.typing_dots)
+
+
+    def append_to_bubble(self, bubble, text):
+        bubble.setText(bubble.text() + text)
+        self.scroll_to_bottom()
+
 
-   
     def add_message(self, message, sender):
         """Add a message bubble to the chat display."""
         bubble = QLabel(message)
@@ -1555,6 +1929,7 @@ class TermsSummarizerApp(QMainWindow):
         # Auto-scroll to the bottom
         
         QTimer.singleShot(20, self.scroll_to_bottom)
+        return bubble
   
    
     def scroll_to_bottom(self):
@@ -1599,11 +1974,14 @@ class TermsSummarizerApp(QMainWindow):
         self.close_button.setVisible( self.isFullScreen())
 
     def closeEvent(self, event):
+        self.jobs.shutdown()
         self.db.close()
         # Accept the event (allows the app to close)
         event.accept()
 
 if __name__ == "__main__":
+    # The summarizer worker process is spawned from this executable when frozen
+    multiprocessing.freeze_support()
     app = QApplication(sys.argv)
     window = TermsSummarizerApp()
     window.show()
@@ -0,0 +1,106 @@
+from concurrent.futures import ThreadPoolExecutor
+from threading import Lock
+
+from api_summary import router, run_model
+from token_budget import MESSAGE_OVERHEAD, count_message_tokens, count_tokens, truncate_to_tokens
+
+HISTORY_TOKENS = 3000  # budget for the history sent with each question
+KEEP_TURNS = 4         # latest question/answer pairs always kept word for word
+COMPACT_BATCH = 2      # turns allowed beyond KEEP_TURNS before they are compacted
+SUMMARY_TOKENS = 400   # completion tokens for the running summary of older turns
+
+COMPACT_PROMPT = ("Summarize this conversation about a terms and conditions document in a few short "
+                  "sentences. Keep the user's questions, the facts given in the answers and anything the "
+                  "user said about themselves. Don't include disclaimers.")
+
+
+def compact_turns(summary, messages):
+    # New running summary covering summary and messages, or None if no model could produce one
+    transcript = "\n".join(f"{message['role'].title()}: {message['content']}" for message in messages)
+    if summary:
+        transcript = f"Summary so far:\n{summary}\n\nLater messages:\n{transcript}"
+
+    for model, limit in router.candidates(count_tokens(transcript)):
+        try:
+            result = run_model(truncate_to_tokens(transcript, limit), model, COMPACT_PROMPT, max_tokens=SUMMARY_TOKENS)
+        except Exception:
+            continue
+        if result and result != "api_error":
+            return result.strip()
+    return None
+
+
+class ChatHistory:
+    # Chat messages with a fixed token budget: the system message is pinned, the last
+    # keep_turns turns are kept verbatim, and older turns are folded into a running
+    # summary by a background thread
+    def __init__(self, system_message, max_tokens=HISTORY_TOKENS, keep_turns=KEEP_TURNS, compact=compact_turns):
+        self.system_message = system_message
+        self.max_tokens = max_tokens
+        self.keep_turns = keep_turns
+        self.compact = compact
+        self.summary = ""
+        self.turns = []  # messages not yet folded into the summary, oldest first
+        self._lock = Lock()
+        self._compacting = None
+        self._executor = ThreadPoolExecutor(max_workers=1)
+
+    def append(self, message):
+        with self._lock:
+            self.turns.append(message)
+            if message["role"] == "assistant":
+                self._schedule_compaction()
+
+    def last_question(self):
+        with self._lock:
+            questions = [message["content"] for message in self.turns if message["role"] == "user"]
+        return questions[-1] if questions else None
+
+    def messages(self):
+        # What to send: system message, summary, then as many of the latest messages
+        # as fit in max_tokens (at least the latest one)
+        with self._lock:
+            summary, turns = self.summary, list(self.turns)
+
+        head = [self.system_message]
+        if summary:
+            head.append({"role": "system", "content": f"Summary of the earlier conversation:\n{summary}"})
+        budget = self.max_tokens - count_message_tokens(head)
+
+        kept = []
+        for message in reversed(turns):
+            cost = count_tokens(message["content"]) + MESSAGE_OVERHEAD
+            if kept and cost > budget:
+                break
+            kept.append(message)
+            budget -= cost
+        kept.reverse()
+
+        # A trimmed history should not open with an answer to a question that was cut
+        while len(kept) > 1 and kept[0]["role"] == "assistant":
+            kept.pop(0)
+        return head + kept
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _schedule_compaction(self):
+        # Called with the lock held, after each answer
+        if self._compacting is not None and not self._compacting.done():
+            return
+        answers = [i for i, message in enumerate(self.turns) if message["role"] == "assistant"]
+        if len(answers) <= self.keep_turns + COMPACT_BATCH:
+            return
+
+        # Everything up to the answer that ends the oldest turn we don't keep
+        old = self.turns[:answers[-self.keep_turns - 1] + 1]
+        self._compacting = self._executor.submit(self._compact, self.summary, old)
+
+    def _compact(self, summary, old):
+        new_summary = self.compact(summary, old)
+        if new_summary is None:
+            return  # keep the turns; messages() trims them to the budget meanwhile
+        with self._lock:
+            # Only appends happen meanwhile, so the compacted turns are still at the front
+            self.summary = new_summary
+            del self.turns[:len(old)]
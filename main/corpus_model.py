@@ -0,0 +1,84 @@
+import glob
+import os
+import sys
+
+from numpy import array, load, savez_compressed
+from sklearn.decomposition import TruncatedSVD
+from sklearn.feature_extraction.text import TfidfVectorizer
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+MODEL_PATH = os.path.join(BASE_DIR, "corpus_model.npz")
+CORPUS_DIR = os.path.join(os.path.dirname(BASE_DIR), "Sample T&Cs")
+
+
+class CorpusModel:
+    # Vectorizers (and the LSA projection) fitted offline on a T&C corpus, so that
+    # summaries only need to call transform at request time
+    def __init__(self, sentence_vectorizer, keyword_vectorizer, lsa_components=None):
+        self.sentence_vectorizer = sentence_vectorizer  # used by tfidf_summary
+        self.keyword_vectorizer = keyword_vectorizer    # used by keyword_summary.apply_lsa
+        self.lsa_components = lsa_components            # n_topics x keyword vocabulary
+
+
+def _fitted_vectorizer(vocabulary, idf, **params):
+    vectorizer = TfidfVectorizer(vocabulary={term: i for i, term in enumerate(vocabulary)}, **params)
+    vectorizer.idf_ = idf
+    return vectorizer
+
+
+def fit_corpus_model(corpus_dir=CORPUS_DIR, n_topics=6):
+    # Imported here so the summarizers can import this module to load the model
+    from tfidf_summary import preprocess_text as sentence_preprocess
+    from keyword_summary import preprocess_text as keyword_preprocess
+
+    sentences, cleaned_sentences = [], []
+    for path in sorted(glob.glob(os.path.join(corpus_dir, "*.txt"))):
+        with open(path, "r", encoding="utf-8") as file:
+            text = file.read()
+        sentences.extend(sentence_preprocess(text))
+        cleaned_sentences.extend(keyword_preprocess(text)[0])
+
+    sentence_vectorizer = TfidfVectorizer(stop_words='english').fit(sentences)
+
+    keyword_vectorizer = TfidfVectorizer()
+    keyword_matrix = keyword_vectorizer.fit_transform(cleaned_sentences)
+    lsa = TruncatedSVD(n_components=n_topics).fit(keyword_matrix)
+
+    return CorpusModel(sentence_vectorizer, keyword_vectorizer, lsa.components_)
+
+
+def save_corpus_model(model, path=MODEL_PATH):
+    # Vocabularies, IDF weights and the LSA components in one compressed .npz
+    savez_compressed(
+        path,
+        sentence_vocabulary=array(model.sentence_vectorizer.get_feature_names_out(), dtype=str),
+        sentence_idf=model.sentence_vectorizer.idf_.astype("float32"),
+        keyword_vocabulary=array(model.keyword_vectorizer.get_feature_names_out(), dtype=str),
+        keyword_idf=model.keyword_vectorizer.idf_.astype("float32"),
+        lsa_components=model.lsa_components.astype("float32"),
+    )
+
+
+_corpus_models = {}
+
+def load_corpus_model(path=MODEL_PATH):
+    # Loaded once per process; None when no model has been fitted
+    if path not in _corpus_models:
+        if not os.path.exists(path):
+            _corpus_models[path] = None
+        else:
+            with load(path) as data:
+                _corpus_models[path] = CorpusModel(
+                    _fitted_vectorizer(data["sentence_vocabulary"], data["sentence_idf"], stop_words='english'),
+                    _fitted_vectorizer(data["keyword_vocabulary"], data["keyword_idf"]),
+                    data["lsa_components"],
+                )
+    return _corpus_models[path]
+
+
+if __name__ == "__main__":
+    # python corpus_model.py [corpus_dir] [output_path]
+    corpus_dir = sys.argv[1] if len(sys.argv) > 1 else CORPUS_DIR
+    output_path = sys.argv[2] if len(sys.argv) > 2 else MODEL_PATH
+    save_corpus_model(fit_corpus_model(corpus_dir), output_path)
+    print(f"Saved corpus model to {output_path}")
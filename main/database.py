@@ -1,14 +1,20 @@
 import sqlite3
 from datetime import datetime
+from threading import Lock
 import os
 
+CACHE_MAX_BYTES = 50 * 1024 * 1024  # LLM response cache size before least recently used entries are evicted
+
 class Database:
-    def __init__(self, db_name="main/summarizer_app.db"):
-        BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-        DB_PATH = os.path.join(BASE_DIR, "summarizer_app.db")
+    def __init__(self, db_name=None, check_same_thread=True):
+        # The app's database next to this file unless another path is given
+        if db_name is None:
+            BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+            db_name = os.path.join(BASE_DIR, "summarizer_app.db")
         self.db_name = db_name
 
-        self.conn = sqlite3.connect(DB_PATH)
+        self.conn = sqlite3.connect(db_name, check_same_thread=check_same_thread)
+        self.lock = Lock()  # serialises cache access when the connection is shared across threads
         self.create_tables()
 
     def create_tables(self):
@@ -37,6 +43,17 @@ class Database:
                 FOREIGN KEY(session_id) REFERENCES LOG(session_id)
             )
         """)
+
+        # Create LLM response cache table, keyed by a hash of the request
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS LLMCache (
+                key TEXT PRIMARY KEY,
+                model TEXT,
+                response TEXT,
+                size INTEGER,
+                last_used TEXT
+            )
+        """)
         
         self.conn.commit()
 
@@ -114,5 +131,42 @@ class Database:
         cursor.execute("DELETE FROM Sessions WHERE session_id = ?", (session_id,))
         self.conn.commit()
 
+    def get_cached_response(self, key):
+        with self.lock:
+            cursor = self.conn.cursor()
+            cursor.execute("SELECT response FROM LLMCache WHERE key = ?", (key,))
+            result = cursor.fetchone()
+            if result is None:
+                return None
+            cursor.execute("UPDATE LLMCache SET last_used = ? WHERE key = ?", (datetime.now().isoformat(), key))
+            self.conn.commit()
+            return result[0]
+
+    def add_cached_response(self, key, model, response, max_bytes=CACHE_MAX_BYTES):
+        with self.lock:
+            cursor = self.conn.cursor()
+            size = len(key) + len(response.encode("utf-8"))
+            cursor.execute("""
+                INSERT OR REPLACE INTO LLMCache (key, model, response, size, last_used) 
+                VALUES (?, ?, ?, ?, ?)
+            """, (key, model, response, size, datetime.now().isoformat()))
+            self.evict_cache(cursor, max_bytes)
+            self.conn.commit()
+
+    def evict_cache(self, cursor, max_bytes=CACHE_MAX_BYTES):
+        # Drop least recently used entries until the cache fits in max_bytes
+        cursor.execute("SELECT COALESCE(SUM(size), 0) FROM LLMCache")
+        excess = cursor.fetchone()[0] - max_bytes
+        if excess <= 0:
+            return
+        cursor.execute("SELECT key, size FROM LLMCache ORDER BY last_used")
+        stale_keys = []
+        for key, size in cursor.fetchall():
+            if excess <= 0:
+                break
+            stale_keys.append((key,))
+            excess -= size
+        cursor.executemany("DELETE FROM LLMCache WHERE key = ?", stale_keys)
+
     def close(self):
         self.conn.close()
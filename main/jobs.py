@@ -0,0 +1,209 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from threading import Event
+import multiprocessing
+import sys
+import time
+
+from PyQt5.QtCore import QEventLoop, QObject, QTimer, pyqtSignal
+from PyQt5.QtWidgets import QApplication
+
+import summary_worker
+
+MAX_THREAD_JOBS = 4   # network-bound jobs running at once
+MAX_PROCESS_JOBS = 2  # CPU-bound jobs running at once, one worker process each
+POLL_INTERVAL = 50    # ms between checks on the worker processes
+
+
+class StreamRenderer:
+    """Batch streamed text and hand it to render at most once per interval."""
+    def __init__(self, render, interval=0.05, repaint=True):
+        self.render = render
+        self.interval = interval
+        self.repaint = repaint  # False off the UI thread, where render should emit a signal
+        self.pending = []
+        self.last_flush = 0.0
+
+    def __call__(self, delta):
+        self.pending.append(delta)
+        if time.monotonic() - self.last_flush >= self.interval:
+            self.flush()
+
+    def flush(self):
+        if self.pending:
+            self.render("".join(self.pending))
+            self.pending = []
+        self.last_flush = time.monotonic()
+        # Repaint now without taking user input while the request is still running
+        if self.repaint:
+            QApplication.processEvents(QEventLoop.ExcludeUserInputEvents)
+
+
+class WorkerProcess:
+    # One spawned worker and the job it is running, if any
+    def __init__(self, context):
+        self.connection, child_connection = context.Pipe()
+        self.process = context.Process(target=summary_worker.worker_main, args=(child_connection,), daemon=True)
+
+        # A spawned child first re-imports the parent's main module, which would load the
+        # whole app (Qt, PDF, OCR) into every worker: point it at the worker module instead
+        main_module = sys.modules["__main__"]
+        sys.modules["__main__"] = summary_worker
+        try:
+            self.process.start()
+        finally:
+            sys.modules["__main__"] = main_module
+        child_connection.close()
+        self.job_id = None
+
+    def run(self, job_id, function, args, kwargs):
+        self.connection.send((job_id, function, args, kwargs))
+        self.job_id = job_id
+
+    def stop(self, terminate=False):
+        if terminate or not self.process.is_alive():
+            self.process.terminate()
+        else:
+            self.connection.send(None)  # let the worker exit its loop
+        self.process.join(timeout=1)
+        self.connection.close()
+
+
+class JobScheduler(QObject):
+    # Runs CPU-bound jobs in worker processes (away from the GIL the UI needs) and
+    # network-bound jobs on threads. Every outcome is delivered as a signal on the
+    # Qt thread. Jobs are called with progress=callable(stage); thread jobs also get
+    # on_token=callable(text) and cancel=threading.Event
+    progress = pyqtSignal(int, str)
+    token = pyqtSignal(int, str)
+    finished = pyqtSignal(int, object)
+    failed = pyqtSignal(int, str)
+    cancelled = pyqtSignal(int)
+
+    def __init__(self, parent=None, max_threads=MAX_THREAD_JOBS, max_processes=MAX_PROCESS_JOBS):
+        super().__init__(parent)
+        self._context = multiprocessing.get_context("spawn")
+        self._threads = ThreadPoolExecutor(max_workers=max_threads)
+        self._thread_jobs = {}   # job id -> cancel Event
+        self._pending = deque()  # process jobs waiting for a worker
+        self._workers = []
+        self.max_processes = max_processes
+        self._next_id = 0
+        self._timer = QTimer(self)
+        self._timer.timeout.connect(self._poll)
+
+    def warm_up(self):
+        # Start the worker processes ahead of the first jobs; each imports the engines once
+        while len(self._workers) < self.max_processes:
+            self._workers.append(WorkerProcess(self._context))
+
+    def run_in_process(self, function, *args, **kwargs):
+        # function and its arguments must be picklable (module-level functions)
+        job_id = self._new_id()
+        self._pending.append((job_id, function, args, kwargs))
+        self.progress.emit(job_id, "Queued")
+        self._dispatch()
+        return job_id
+
+    def run_in_thread(self, function, *args, **kwargs):
+        job_id = self._new_id()
+        cancel = Event()
+        self._thread_jobs[job_id] = cancel
+        renderer = StreamRenderer(lambda text: self.token.emit(job_id, text), repaint=False)
+
+        def run():
+            try:
+                result = function(*args, progress=lambda stage: self.progress.emit(job_id, stage),
+                                  on_token=renderer, cancel=cancel, **kwargs)
+                renderer.flush()
+            except Exception as e:
+                outcome = ("failed", str(e))
+            else:
+                outcome = ("finished", result)
+            self._thread_jobs.pop(job_id, None)
+            if cancel.is_set():
+                self.cancelled.emit(job_id)
+            elif outcome[0] == "failed":
+                self.failed.emit(job_id, outcome[1])
+            else:
+                self.finished.emit(job_id, outcome[1])
+
+        self._threads.submit(run)
+        return job_id
+
+    def cancel(self, job_id):
+        if job_id in self._thread_jobs:
+            # Thread jobs stop cooperatively at their next check
+            self._thread_jobs[job_id].set()
+            return
+
+        for task in self._pending:
+            if task[0] == job_id:
+                self._pending.remove(task)
+                self.cancelled.emit(job_id)
+                return
+
+        for worker in self._workers:
+            if worker.job_id == job_id:
+                # A running computation can't be interrupted: replace its worker process
+                self._workers.remove(worker)
+                worker.stop(terminate=True)
+                self.cancelled.emit(job_id)
+                self._dispatch()
+                return
+
+    def shutdown(self):
+        for cancel in self._thread_jobs.values():
+            cancel.set()
+        self._threads.shutdown(wait=False, cancel_futures=True)
+        self._pending.clear()
+        for worker in self._workers:
+            worker.stop(terminate=worker.job_id is not None)
+        self._workers = []
+
+    def _new_id(self):
+        self._next_id += 1
+        return self._next_id
+
+    def _dispatch(self):
+        for worker in [worker for worker in self._workers if worker.job_id is None and not worker.process.is_alive()]:
+            self._workers.remove(worker)  # died while idle
+            worker.stop()
+        while self._pending:
+            worker = next((worker for worker in self._workers if worker.job_id is None), None)
+            if worker is None:
+                if len(self._workers) >= self.max_processes:
+                    return
+                worker = WorkerProcess(self._context)
+                self._workers.append(worker)
+            job_id, function, args, kwargs = self._pending.popleft()
+            worker.run(job_id, function, args, kwargs)
+            self.progress.emit(job_id, "Starting")
+            self._timer.start(POLL_INTERVAL)
+
+    def _poll(self):
+        for worker in list(self._workers):
+            try:
+                while worker.connection.poll():
+                    job_id, kind, payload = worker.connection.recv()
+                    if kind == "progress":
+                        self.progress.emit(job_id, payload)
+                        continue
+                    worker.job_id = None
+                    if kind == "finished":
+                        self.finished.emit(job_id, payload)
+                    else:
+                        self.failed.emit(job_id, payload)
+            except (EOFError, OSError):
+                pass
+
+            if not worker.process.is_alive():
+                # The worker died (e.g. out of memory): report its job and start afresh
+                self._workers.remove(worker)
+                worker.stop()
+                if worker.job_id is not None:
+                    self.failed.emit(worker.job_id, "The summarizer process stopped unexpectedly.")
+
+        self._dispatch()
+        if not self._pending and all(worker.job_id is None for worker in self._workers):
+            self._timer.stop()
@@ -1,10 +1,14 @@
-from numpy import mean
-from sklearn.feature_extraction.text import TfidfVectorizer
+from numpy import argmax, float32, inf, maximum, ones, zeros
+from numpy.linalg import norm
+from scipy.sparse import csr_matrix
+from sklearn.feature_extraction.text import CountVectorizer, TfidfVectorizer
 from sklearn.decomposition import TruncatedSVD
-from sklearn.metrics.pairwise import cosine_similarity
 from nltk.corpus import stopwords
-from nltk.tokenize import sent_tokenize, word_tokenize
-from regex import match, sub
+from nltk.tokenize import word_tokenize
+from regex import compile as compile_pattern
+
+from segmenter import segment
+from corpus_model import load_corpus_model
 
 from nltk import pos_tag
 
@@ -46,26 +50,56 @@ LEGAL_KEYWORDS = {
 buzzwords = []
 
 
-def preprocess_text(text):
-    sentences = sent_tokenize(text)
-    cleaned_sentences = []
-    stop_words = set(stopwords.words('english'))
-    
-    for sentence in sentences:
-        # Filter out uppercase headers or short, non-informative phrases
-        if sentence.isupper() or match(r'^[A-Z]\.\s+[A-Z\s]+$', sentence) or len(sentence.split()) < 2:
-            continue
-        
-        # Remove non-word characters and filter buzzwords and stopwords
-        words = word_tokenize(sentence.lower())
-        words = [sub(r'\W+', '', word) for word in words]
-        words = [word for word in words if word not in stop_words and word not in buzzwords and word.isalpha()]
+# Compiled once and shared by every call
+HEADER_PATTERN = compile_pattern(r'^[A-Z]\.\s+[A-Z\s]+$')
+SPLIT_PATTERN = compile_pattern(r'[,;:!?@#()\[\]{}"“”‘’«»—–]')  # punctuation word_tokenize splits words on
+CLITIC_PATTERN = compile_pattern(r"(?<=\w)(['’](?:s|re|ve|ll|d|m)|n['’]t)\b")  # split off like word_tokenize does
+STRIP_PATTERN = compile_pattern(r'[^\w\s]+')  # what is left of non-word characters inside words
+SENTENCE_SEPARATOR = '\n'  # sentences are joined on newlines for batch cleaning
+
+_stop_words = None
+
+def get_stop_words():
+    global _stop_words
+    if _stop_words is None:
+        _stop_words = frozenset(stopwords.words('english')) | frozenset(buzzwords)
+    return _stop_words
+
+
+def clean_words(text):
+    # Lowercased alphabetic words of text with stopwords and buzzwords removed
+    stop_words = get_stop_words()
+    text = STRIP_PATTERN.sub('', CLITIC_PATTERN.sub(r' \1', SPLIT_PATTERN.sub(' ', text.lower())))
+    return [word for word in text.split() if word.isalpha() and word not in stop_words]
+
+
+def clean_sentences(sentences):
+    # Filter out uppercase headers or short, non-informative phrases
+    candidates = [i for i, sentence in enumerate(sentences)
+                  if not (sentence.isupper() or HEADER_PATTERN.match(sentence) or len(sentence.split()) < 2)]
+
+    # Clean every candidate in one pass of the compiled patterns over the joined text
+    joined = SENTENCE_SEPARATOR.join(sentences[i].replace(SENTENCE_SEPARATOR, ' ') for i in candidates)
+    joined = STRIP_PATTERN.sub('', CLITIC_PATTERN.sub(r' \1', SPLIT_PATTERN.sub(' ', joined.lower())))
+
+    stop_words = get_stop_words()
+    cleaned_sentences, kept_indices = [], []
+    for i, sentence in zip(candidates, joined.split(SENTENCE_SEPARATOR)):
+        words = [word for word in sentence.split() if word.isalpha() and word not in stop_words]
         
         # Only keep sentences that are longer than two words and are not just numbers/letters
         if len(words) > 3:
             cleaned_sentences.append(' '.join(words))
-        
-    return cleaned_sentences, sentences
+            kept_indices.append(i)
+
+    return cleaned_sentences, kept_indices
+
+
+def preprocess_text(text):
+    # Returns the cleaned sentences and, index for index, the original sentences they came from
+    sentences = segment(text)
+    cleaned_sentences, kept_indices = clean_sentences(sentences)
+    return cleaned_sentences, [sentences[i] for i in kept_indices]
 
 def is_meaningful(sentence):
     tokens = word_tokenize(sentence)
@@ -82,63 +116,145 @@ def is_meaningful(sentence):
     return (has_noun and has_verb) or has_legal_keyword
 
 
+class TopicMatcher:
+    # Compiled once from a topics dict: every keyword phrase is cleaned the same
+    # way as the sentences, and a phrase x topic matrix maps matches to topics.
+    # A phrase counts as many times as it has words, so "limitation of liability"
+    # outweighs the "liability" it contains
+    def __init__(self, topics):
+        self.topic_names = list(topics)
+
+        phrases = {}
+        phrase_rows, topic_cols = [], []
+        for t, keywords in enumerate(topics.values()):
+            for keyword in keywords:
+                words = clean_words(keyword)
+                if not words:
+                    continue
+                phrase_rows.append(phrases.setdefault(' '.join(words), len(phrases)))
+                topic_cols.append(t)
+
+        max_words = max((len(phrase.split()) for phrase in phrases), default=1)
+        self.vectorizer = CountVectorizer(vocabulary=phrases, ngram_range=(1, max_words),
+                                          token_pattern=r'(?u)\b\w+\b', binary=True)
+        phrase_lengths = {index: len(phrase.split()) for phrase, index in phrases.items()}
+        self.topic_matrix = csr_matrix(([phrase_lengths[row] for row in phrase_rows], (phrase_rows, topic_cols)),
+                                       shape=(len(phrases), len(self.topic_names)))
+
+    def score(self, cleaned_sentences):
+        # sentences x topics: words in the distinct keyword phrases of each topic found
+        return self.vectorizer.transform(cleaned_sentences) @ self.topic_matrix
+
+
+_topic_matchers = {}
+
+def get_topic_matcher(topics):
+    key = tuple((topic, tuple(keywords)) for topic, keywords in topics.items())
+    if key not in _topic_matchers:
+        _topic_matchers[key] = TopicMatcher(topics)
+    return _topic_matchers[key]
+
+
 def classify_sentences_by_topic(cleaned_sentences, topics):
     sentence_topics = {}
-    
-    # Preprocess topics to lowercase and set keywords for faster lookup
-    processed_topics = {topic: set(keyword.lower() for keyword in keywords) for topic, keywords in topics.items()}
-    
+    if not cleaned_sentences:
+        return sentence_topics
+
+    matcher = topics if isinstance(topics, TopicMatcher) else get_topic_matcher(topics)
+    scores = matcher.score(cleaned_sentences).toarray()
+
+    # Each sentence goes to its best-scoring topic (ties go to the earlier topic)
+    best_topics = scores.argmax(axis=1)
+    matched = scores.max(axis=1) > 0
+
     for i, sentence in enumerate(cleaned_sentences):
-        words = set(word.lower() for word in sentence.split())
-        
-        if len(words) <= 2:
-            continue
-        
-        for topic, keywords in processed_topics.items():
-            if keywords.intersection(words):
-                sentence_topics.setdefault(topic, []).append(i)
-                break  # Stop checking other topics once a match is found
+        if matched[i] and len(set(sentence.split())) > 2:
+            sentence_topics.setdefault(matcher.topic_names[best_topics[i]], []).append(i)
 
     return sentence_topics
 
 
+ARPACK_MAX_SIZE = 200  # below this ARPACK beats the randomized solver
+MIN_LSA_SENTENCES = 10  # below this the TF-IDF rows are used directly
+
+
 def apply_lsa(cleaned_sentences, n_topics=6):
-    vectorizer = TfidfVectorizer()
+    # Project with the corpus-fitted LSA model when one has been saved
+    corpus_model = load_corpus_model()
+    if corpus_model is not None and corpus_model.lsa_components is not None:
+        vectorizer = corpus_model.keyword_vectorizer
+        tfidf_matrix = vectorizer.transform(cleaned_sentences).astype(float32)
+        return tfidf_matrix @ corpus_model.lsa_components.T, vectorizer
+
+    vectorizer = TfidfVectorizer(dtype=float32)
     tfidf_matrix = vectorizer.fit_transform(cleaned_sentences)
     
-    lsa = TruncatedSVD(n_components=n_topics)
+    # Never ask for more components than the matrix can give
+    n_sentences, n_features = tfidf_matrix.shape
+    n_components = min(n_topics, n_sentences - 1, n_features - 1)
+    if n_sentences < MIN_LSA_SENTENCES or n_components < 2:
+        # Too small for a meaningful projection: compare the TF-IDF rows themselves
+        return tfidf_matrix.toarray(), vectorizer
+
+    algorithm = 'arpack' if min(n_sentences, n_features) <= ARPACK_MAX_SIZE else 'randomized'
+    lsa = TruncatedSVD(n_components=n_components, algorithm=algorithm, random_state=0)
     lsa_matrix = lsa.fit_transform(tfidf_matrix)
     
     return lsa_matrix, vectorizer
 
-def mmr_selection(topic_sentences, lsa_matrix, lambda_param=0.9, num_sentences=2):
-    selected_sentences = []
-    unselected = topic_sentences[:]
-    
-    selected_sentences.append(unselected.pop(0))
-    
-    while len(selected_sentences) < num_sentences and unselected:
-        max_mmr = -float("inf")
-        best_sentence = None
-        
-        for i in unselected:
-            relevance = cosine_similarity(lsa_matrix[i].reshape(1, -1), mean(lsa_matrix[selected_sentences], axis=0).reshape(1, -1)).flatten()[0]
-            redundancy = max(cosine_similarity(lsa_matrix[i].reshape(1, -1), lsa_matrix[j].reshape(1, -1))[0][0] for j in selected_sentences)
-            
-            mmr_score = lambda_param * relevance - (1 - lambda_param) * redundancy
-            if mmr_score > max_mmr:
-                max_mmr = mmr_score
-                best_sentence = i
-                
-        selected_sentences.append(best_sentence)
-        unselected.remove(best_sentence)
+def normalize_rows(matrix):
+    # Unit-length rows so cosine similarity becomes a plain dot product
+    norms = norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return matrix / norms
+
+
+def mmr_selection(topic_sentences, lsa_matrix, lambda_param=0.9, num_sentences=2, normalized_matrix=None):
+    if normalized_matrix is None:
+        normalized_matrix = normalize_rows(lsa_matrix)
+
+    candidates = list(topic_sentences)
+    selected_sentences = [candidates[0]]
+    unselected = ones(len(candidates), dtype=bool)
+    unselected[0] = False
+
+    candidate_vectors = normalized_matrix[candidates]
+    selected_sum = lsa_matrix[candidates[0]].copy()
+    # Running max similarity of every candidate to the sentences picked so far
+    redundancy = candidate_vectors @ normalized_matrix[candidates[0]]
+
+    while len(selected_sentences) < num_sentences and unselected.any():
+        # Cosine similarity to the mean of the selected vectors (the mean and the
+        # sum point the same way)
+        centroid_norm = norm(selected_sum)
+        relevance = candidate_vectors @ (selected_sum / centroid_norm) if centroid_norm else zeros(len(candidates))
+
+        mmr_scores = lambda_param * relevance - (1 - lambda_param) * redundancy
+        mmr_scores[~unselected] = -inf
+        best = int(argmax(mmr_scores))
+
+        selected_sentences.append(candidates[best])
+        unselected[best] = False
+        selected_sum += lsa_matrix[candidates[best]]
+        maximum(redundancy, candidate_vectors @ candidate_vectors[best], out=redundancy)
     
     return selected_sentences
 
-def ag_generate_summary(text, num_sentences=3):
+def ag_generate_summary(text, num_sentences=3, progress=None):
+    # progress, if given, is called with a description of each stage
+    progress = progress or (lambda stage: None)
+    progress("Cleaning sentences")
     cleaned_sentences, original_sentences = preprocess_text(text)
+    if not cleaned_sentences:
+        return {}
+
+    progress("Matching sentences to topics")
     sentence_topics = classify_sentences_by_topic(cleaned_sentences, topics)
+    # One projection and one normalisation shared by every topic's MMR pass
+    progress("Projecting sentences onto topics (LSA)")
     lsa_matrix, vectorizer = apply_lsa(cleaned_sentences)
+    normalized_matrix = normalize_rows(lsa_matrix)
+    progress("Selecting sentences per topic")
     
     summary = {}
     selected_memory = set()
@@ -147,7 +263,8 @@ def ag_generate_summary(text, num_sentences=3):
         if not sentence_indices:
             continue
         
-        selected_indices = mmr_selection(sentence_indices, lsa_matrix, num_sentences=num_sentences)
+        selected_indices = mmr_selection(sentence_indices, lsa_matrix, num_sentences=num_sentences,
+                                         normalized_matrix=normalized_matrix)
         valuable_sentences = [original_sentences[i] for i in selected_indices if i not in selected_memory]
         
         if valuable_sentences:
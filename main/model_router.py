@@ -0,0 +1,182 @@
+from collections import deque
+from threading import Lock
+import os
+import time
+
+from groq import Groq
+
+REQUEST_TIMEOUT = 60.0   # seconds before a request counts as failed
+FAILURE_THRESHOLD = 3    # consecutive failures that open a model's circuit
+COOLDOWN = 30.0          # seconds an open circuit stays open
+FAILURE_PENALTY = 30.0   # seconds of latency one recent failure is worth when ranking
+SMOOTHING = 0.3          # weight of the newest sample in the moving averages
+LATENCY_WINDOW = 100     # recent response times kept per model for percentiles
+MIN_LATENCY_SAMPLES = 5  # samples needed before a percentile is trusted
+
+HEDGE_PERCENTILE = 95    # hedge once the primary is slower than this share of its responses
+HEDGE_MIN_DELAY = 0.5    # seconds, bounds on the hedge delay
+HEDGE_MAX_DELAY = 10.0
+HEDGE_DEFAULT_DELAY = 3.0  # seconds, until the primary has enough samples
+
+DEFAULT_BASE_URL = "https://api.groq.com"  # what the groq SDK uses unless GROQ_BASE_URL is set
+
+
+class ModelStats:
+    def __init__(self):
+        self.requests = 0
+        self.failures = 0
+        self.consecutive_failures = 0
+        self.latency = None    # moving average, seconds
+        self.error_rate = 0.0  # moving average of failures
+        self.open_until = 0.0  # circuit is open (model skipped) until this time
+        self.response_times = deque(maxlen=LATENCY_WINDOW)  # seconds until the answer started
+
+    def is_open(self, now):
+        return now < self.open_until
+
+    def score(self, default_latency=0.0):
+        # Lower is healthier; models without latency samples count as average
+        latency = default_latency if self.latency is None else self.latency
+        return latency + self.error_rate * FAILURE_PENALTY
+
+
+class ModelRouter:
+    # Long-lived router shared by every request: reuses one Groq client per API key and endpoint
+    # and sends each request to the healthiest model, skipping models whose
+    # circuit breaker is open
+    def __init__(self, models, limiter=None, failure_threshold=FAILURE_THRESHOLD, cooldown=COOLDOWN):
+        self.models = list(models)  # (model, input limit in tokens), in preference order
+        self.limiter = limiter      # optional RateLimiter: models out of quota are tried last
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.stats = {model: ModelStats() for model, _ in self.models}
+        self._clients = {}
+        self._lock = Lock()
+
+    def get_client(self):
+        api_key = os.getenv("GROQ_API_KEY")
+        if not api_key:
+            return None
+        key = (api_key, self.base_url())
+        with self._lock:
+            if key not in self._clients:
+                # Failover is handled here, so the client should not retry on its own
+                self._clients[key] = Groq(api_key=api_key, base_url=key[1], timeout=REQUEST_TIMEOUT, max_retries=0)
+            return self._clients[key]
+
+    def base_url(self):
+        # The endpoint the clients talk to
+        return os.getenv("GROQ_BASE_URL") or DEFAULT_BASE_URL
+
+    def candidates(self, input_size=0, tokens=0):
+        # Models to try in order: closed circuits with quota left that fit the input
+        # first, ranked by health
+        now = time.monotonic()
+        quota_waits = {model: self.limiter.wait_time(model, tokens) if self.limiter else 0.0
+                       for model, _ in self.models}
+        with self._lock:
+            # Untried models rank as average so they don't jump ahead of a model that works
+            # (and whose responses are already cached)
+            latencies = [stats.latency for stats in self.stats.values() if stats.latency is not None]
+            default_latency = sum(latencies) / len(latencies) if latencies else 0.0
+            ranked = sorted(
+                enumerate(self.models),
+                key=lambda item: (self.stats[item[1][0]].is_open(now),
+                                  quota_waits[item[1][0]] > 0,
+                                  item[1][1] < input_size,
+                                  self.stats[item[1][0]].score(default_latency),
+                                  item[0]),
+            )
+            available = [model for _, (model, limit) in ranked if not self.stats[model].is_open(now)]
+            if available:
+                return [(model, limit) for _, (model, limit) in ranked if model in available]
+
+            # Every circuit is open: try the one that reopens first rather than fail outright
+            return sorted(self.models, key=lambda item: self.stats[item[0]].open_until)
+
+    def response_time_percentile(self, model, percentile):
+        # None until the model has answered often enough for the percentile to mean anything
+        with self._lock:
+            samples = sorted(self.stats[model].response_times)
+        if len(samples) < MIN_LATENCY_SAMPLES:
+            return None
+        return samples[min(len(samples) - 1, int(len(samples) * percentile / 100))]
+
+    def record_success(self, model, latency, response_time=None):
+        # response_time: seconds until the first streamed token (the full latency otherwise)
+        with self._lock:
+            stats = self.stats[model]
+            stats.response_times.append(latency if response_time is None else response_time)
+            stats.requests += 1
+            stats.consecutive_failures = 0
+            stats.open_until = 0.0
+            stats.latency = latency if stats.latency is None else (1 - SMOOTHING) * stats.latency + SMOOTHING * latency
+            stats.error_rate = (1 - SMOOTHING) * stats.error_rate
+
+    def record_abandoned(self, model, elapsed):
+        # An attempt dropped because another model answered first: it took at least
+        # elapsed seconds, which is a latency sample but not a failure
+        with self._lock:
+            stats = self.stats[model]
+            stats.response_times.append(elapsed)
+            stats.latency = elapsed if stats.latency is None else (1 - SMOOTHING) * stats.latency + SMOOTHING * elapsed
+
+    def record_failure(self, model, error=None):
+        with self._lock:
+            stats = self.stats[model]
+            stats.requests += 1
+            stats.failures += 1
+            stats.consecutive_failures += 1
+            stats.error_rate = (1 - SMOOTHING) * stats.error_rate + SMOOTHING
+
+            if getattr(error, "status_code", None) == 429:
+                # Rate limited: stay away for as long as the API asks, or the cooldown
+                stats.open_until = time.monotonic() + self._retry_after(error)
+            elif stats.consecutive_failures >= self.failure_threshold:
+                stats.open_until = time.monotonic() + self.cooldown
+
+    def _retry_after(self, error):
+        try:
+            return float(error.response.headers.get("retry-after"))
+        except (AttributeError, TypeError, ValueError):
+            return self.cooldown
+
+
+class HedgePolicy:
+    # When to send a second copy of a slow request to the next model: after the
+    # primary's percentile response time, clamped to [min_delay, max_delay].
+    # Counts how often hedges were fired and how often the hedge answered first
+    def __init__(self, router, percentile=HEDGE_PERCENTILE, min_delay=HEDGE_MIN_DELAY,
+                 max_delay=HEDGE_MAX_DELAY, default_delay=HEDGE_DEFAULT_DELAY, max_hedges=1):
+        self.router = router
+        self.percentile = percentile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.default_delay = default_delay
+        self.max_hedges = max_hedges  # extra models a single request may be sent to
+        self.requests = 0
+        self.fired = 0
+        self.won = 0
+        self._lock = Lock()
+
+    def delay(self, model):
+        delay = self.router.response_time_percentile(model, self.percentile)
+        if delay is None:
+            return self.default_delay
+        return min(self.max_delay, max(self.min_delay, delay))
+
+    def record(self, hedges_fired, hedge_won):
+        with self._lock:
+            self.requests += 1
+            self.fired += hedges_fired
+            self.won += hedge_won
+
+    def report(self):
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "hedges_fired": self.fired,
+                "hedges_won": self.won,
+                "fire_rate": self.fired / self.requests if self.requests else 0.0,
+                "win_rate": self.won / self.fired if self.fired else 0.0,
+            }
@@ -0,0 +1,108 @@
+from threading import Condition
+import time
+
+# (requests per minute, tokens per minute) allowed for each model
+MODEL_QUOTAS = {
+    "llama3-8b-8192": (30, 30000),
+    "llama-3.1-8b-instant": (30, 20000),
+    "gemma2-9b-it": (30, 15000),
+}
+DEFAULT_QUOTA = (30, 6000)
+
+MAX_QUEUE_WAIT = 5.0  # seconds a request may wait for quota before trying another model
+CANCEL_CHECK_INTERVAL = 0.5  # seconds between cancel checks while waiting for quota
+
+
+class RateLimitExceeded(Exception):
+    pass
+
+
+class TokenBucket:
+    def __init__(self, capacity, per_second):
+        self.capacity = capacity
+        self.per_second = per_second
+        self.level = capacity
+        self.updated = time.monotonic()
+
+    def refill(self, now):
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.per_second)
+        self.updated = now
+
+    def wait_time(self, amount):
+        # Seconds until amount is available (requests larger than the bucket wait for a full one)
+        missing = min(amount, self.capacity) - self.level
+        return max(0.0, missing / self.per_second)
+
+
+class RateLimiter:
+    # Client-side requests-per-minute and tokens-per-minute buckets per model, shared by
+    # the summarizer and the chatbot so work is queued or rerouted before Groq returns 429
+    def __init__(self, quotas=MODEL_QUOTAS):
+        self.quotas = dict(quotas)
+        self._buckets = {}
+        self._condition = Condition()
+
+    def _model_buckets(self, model):
+        if model not in self._buckets:
+            rpm, tpm = self.quotas.get(model, DEFAULT_QUOTA)
+            self._buckets[model] = (TokenBucket(rpm, rpm / 60), TokenBucket(tpm, tpm / 60))
+        requests, tokens = self._buckets[model]
+        now = time.monotonic()
+        requests.refill(now)
+        tokens.refill(now)
+        return requests, tokens
+
+    def budget(self, model):
+        # (requests, tokens) that can be spent on model right now
+        with self._condition:
+            requests, tokens = self._model_buckets(model)
+            return int(requests.level), int(tokens.level)
+
+    def wait_time(self, model, tokens):
+        with self._condition:
+            request_bucket, token_bucket = self._model_buckets(model)
+            return max(request_bucket.wait_time(1), token_bucket.wait_time(tokens))
+
+    def try_acquire(self, model, tokens):
+        with self._condition:
+            return self._try_acquire(model, tokens)
+
+    def _try_acquire(self, model, tokens):
+        request_bucket, token_bucket = self._model_buckets(model)
+        if request_bucket.wait_time(1) > 0 or token_bucket.wait_time(tokens) > 0:
+            return False
+        request_bucket.level -= 1
+        token_bucket.level -= min(tokens, token_bucket.capacity)
+        return True
+
+    def acquire(self, model, tokens, timeout=MAX_QUEUE_WAIT, cancel=None):
+        # Wait (queue) up to timeout seconds for quota, or for as long as it takes with
+        # timeout=None; False means try another model, or that the cancel Event was set
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._condition:
+            while not self._try_acquire(model, tokens):
+                if cancel is not None and cancel.is_set():
+                    return False
+                request_bucket, token_bucket = self._buckets[model]
+                wait = max(request_bucket.wait_time(1), token_bucket.wait_time(tokens))
+                if deadline is not None and wait > deadline - time.monotonic():
+                    return False
+                if cancel is not None:
+                    wait = min(wait, CANCEL_CHECK_INTERVAL)
+                self._condition.wait(wait)
+            return True
+
+    def settle(self, model, estimated, actual):
+        # Correct the token bucket once the API reports the real usage
+        with self._condition:
+            _, token_bucket = self._model_buckets(model)
+            charged = min(estimated, token_bucket.capacity)
+            token_bucket.level = min(token_bucket.capacity, token_bucket.level + charged - actual)
+            self._condition.notify_all()
+
+    def choose_model(self, models, tokens):
+        # First model that can take the request now, else the one that frees up soonest
+        return min(models, key=lambda model: self.wait_time(model, tokens))
+
+
+limiter = RateLimiter()
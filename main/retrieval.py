@@ -0,0 +1,87 @@
+from numpy import arange, bincount, diff, float32, log, repeat
+from sklearn.feature_extraction.text import CountVectorizer
+
+from tfidf_summary import top_n_indices
+from token_budget import chunk_spans, count_tokens
+
+CHUNK_TOKENS = 200     # tokens per indexed chunk (a few consecutive clauses)
+TOP_K = 4              # chunks sent with each question
+CONTEXT_TOKENS = 1000  # cap on the excerpts in one request, whatever the document's size
+PREVIOUS_QUESTION_WEIGHT = 0.5  # follow-ups like "what about refunds?" also search the last question
+BM25_K1 = 1.5
+BM25_B = 0.75
+
+# Chat models in order of preference; the rate limiter picks the first with quota left
+CHAT_MODELS = ["llama-3.1-8b-instant", "llama3-8b-8192", "gemma2-9b-it"]
+CHAT_MAX_TOKENS = 5000  # upper bound on a reply; each gets what the context window leaves
+MIN_REPLY_TOKENS = 256  # below this the conversation no longer leaves room for an answer
+
+CHAT_PROMPT = ("You must strictly limit the conversation to the provided terms and conditions. "
+               "Do not answer question that are absolutely unrelated to the provided content "
+               "Talk point to point. "
+               "Each question comes with the excerpts of the terms and conditions that match it; "
+               "answer from those excerpts and say so when they do not cover the question.")
+
+
+class ChunkIndex:
+    # BM25 index over a document's clauses, built once when a chat starts so that
+    # each question only sends the few chunks that match it
+    def __init__(self, text, chunk_tokens=CHUNK_TOKENS, k1=BM25_K1, b=BM25_B):
+        self.text = text
+        self.spans = chunk_spans(text, chunk_tokens)
+        self.vectorizer = CountVectorizer(stop_words='english')
+        try:
+            counts = self.vectorizer.fit_transform([text[start:end] for start, end in self.spans]).astype(float32)
+        except ValueError:
+            # Nothing but stop words (or no text at all): every search comes back empty
+            self.weights = None
+            return
+
+        # Precompute each term's BM25 weight in each chunk, so a search is one sparse product
+        n_chunks, n_terms = counts.shape
+        document_frequency = bincount(counts.indices, minlength=n_terms)
+        idf = log(1 + (n_chunks - document_frequency + 0.5) / (document_frequency + 0.5)).astype(float32)
+        lengths = counts.sum(axis=1).A1
+        length_norm = 1 - b + b * lengths / max(lengths.mean(), 1)
+        rows = repeat(arange(n_chunks), diff(counts.indptr))
+        tf = counts.data
+        counts.data = idf[counts.indices] * tf * (k1 + 1) / (tf + k1 * length_norm[rows])
+        self.weights = counts
+
+    def chunk(self, i):
+        start, end = self.spans[i]
+        return self.text[start:end]
+
+    def search(self, question, k=TOP_K, previous_question=None):
+        # Indices of the k best matching chunks, best first; chunks sharing no term are left out
+        if self.weights is None:
+            return []
+        query = self.vectorizer.transform([question])
+        if previous_question:
+            query = query + PREVIOUS_QUESTION_WEIGHT * self.vectorizer.transform([previous_question])
+        scores = (self.weights @ query.T.astype(float32)).toarray().ravel()
+        return [i for i in top_n_indices(scores, k)[::-1] if scores[i] > 0]
+
+    def context(self, question, k=TOP_K, max_tokens=CONTEXT_TOKENS, previous_question=None):
+        # The best chunks that fit in max_tokens, in document order, as numbered excerpts
+        selected, used = [], 0
+        for i in self.search(question, k, previous_question):
+            tokens = count_tokens(self.chunk(i))
+            if used + tokens > max_tokens:
+                continue
+            selected.append(i)
+            used += tokens
+        return "\n\n".join(f"[{n}] {self.chunk(i).strip()}" for n, i in enumerate(sorted(selected), 1))
+
+
+def question_messages(history, index):
+    # The chat history as sent to the model: only the last question carries the excerpts
+    # (the stored history keeps the bare questions, so the prompt stays bounded)
+    questions = [message["content"] for message in history if message["role"] == "user"]
+    if not questions or history[-1]["role"] != "user":
+        return list(history)
+    previous_question = questions[-2] if len(questions) > 1 else None
+    excerpts = index.context(questions[-1], previous_question=previous_question) or "(no matching excerpts)"
+    return history[:-1] + [{"role": "user", "content": (
+        f"Excerpts from the terms and conditions:\n{excerpts}\n\nQuestion: {questions[-1]}"
+    )}]
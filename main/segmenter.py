@@ -0,0 +1,112 @@
+from regex import compile as compile_pattern, IGNORECASE
+
+
+# Abbreviations common in terms and conditions that end in a period without ending the sentence
+ABBREVIATIONS = frozenset([
+    "mr", "mrs", "ms", "dr", "prof", "st", "jr", "sr",
+    "inc", "ltd", "llc", "llp", "co", "corp", "plc", "pty", "gmbh", "bv", "dept", "est",
+    "art", "arts", "sec", "secs", "para", "paras", "cl", "ch", "pt", "pp", "p", "fig", "approx",
+    "vs", "v", "e.g", "i.e", "cf", "viz", "al", "u.s", "u.k", "u.s.a", "e.u",
+    "jan", "feb", "mar", "apr", "jun", "jul", "aug", "sep", "sept", "oct", "nov", "dec",
+])
+
+# Abbreviations that only hold a sentence together when a number follows ("No. 5", "Nos. 3-4")
+NUMBER_ABBREVIATIONS = frozenset(["no", "nos"])
+
+# One pass over the text finds every candidate boundary: sentence punctuation followed by
+# whitespace, or a line break not preceded by sentence punctuation
+BOUNDARY_PATTERN = compile_pattern(r"(?P<punct>[.!?]+[\"'”’)\]]*)\s+|[ \t\r]*\n\s*")
+BLANK_LINE_PATTERN = compile_pattern(r"\n[ \t\r]*\n")
+
+CLAUSE_NUMBER_PATTERN = compile_pattern(r"^\(?(\d+(\.\d+)*|[ivxlc]+|[a-z])\)?$", IGNORECASE)
+LIST_ITEM_PATTERN = compile_pattern(r"[-•*▪●]\s|\(?(\d+(\.\d+)*|[a-z]|[ivx]+)[.)]\s|\d+(\.\d+)+\s")
+# "(7) " also appears mid-sentence ("up to seven\n(7) times"), so it only starts an item
+# after a line that ends where a list could continue
+INLINE_MARKER_PATTERN = compile_pattern(r"\((\d+|[a-z]|[ivx]+)\)\s")
+ITEM_END_PATTERN = compile_pattern(r"([:;,.]|\b(and|or))$", IGNORECASE)
+
+
+def _is_heading(line, next_line):
+    # A whole line in capitals ("LIMITATION OF LIABILITY") or title case ("9. Force
+    # Majeure") followed by ordinary text; a short line alone says nothing, since PDF
+    # text is hard-wrapped mid-sentence
+    words = [word for word in line.split() if word[:1].isalpha()]
+    if not words or line[-1:] in ",;" or not any(char.islower() for char in next_line):
+        return False
+    if not any(char.islower() for char in line):
+        return True
+    return all(word[0].isupper() for word in words if len(word) > 3)
+
+
+def _starts_sentence(text, pos):
+    # Sentences start with a capital, a digit, an opening quote/bracket or a list marker
+    if pos >= len(text):
+        return True
+    char = text[pos]
+    return char.isupper() or char.isdigit() or char in "\"'“‘([•-*▪●"
+
+
+def _is_boundary(text, match, line_start, sentence_start):
+    start, end = match.span()
+    if end >= len(text) or BLANK_LINE_PATTERN.search(text, start, end):
+        return True
+
+    if match.group("punct") is None:
+        # Single line break: split after headings and colons and before list items /
+        # numbered clauses, otherwise it is a wrapped line
+        line = text[line_start:start].strip()
+        if LIST_ITEM_PATTERN.match(text, end):
+            return not INLINE_MARKER_PATTERN.match(text, end) or ITEM_END_PATTERN.search(line) is not None
+        if not _starts_sentence(text, end):
+            return False
+        next_line_end = text.find("\n", end)
+        next_line = text[end:next_line_end if next_line_end != -1 else len(text)]
+        return line[-1:] == ":" or (not text[sentence_start:line_start].strip() and _is_heading(line, next_line))
+
+    if not _starts_sentence(text, end):
+        return False
+
+    punct = match.group("punct")
+    if not punct.startswith(".") or len(punct.rstrip("\"'”’)]")) > 1:
+        return True  # "!", "?" or an ellipsis
+
+    # Look at the word right before the period
+    word_start = max(text.rfind(" ", line_start, start), text.rfind("\t", line_start, start), line_start - 1) + 1
+    word = text[word_start:start].lstrip("(\"'“‘")
+    if word.lower() in NUMBER_ABBREVIATIONS:
+        return not text[end:end + 1].isdigit()  # "No. 5", but "the answer is no. You..."
+    if word.lower() in ABBREVIATIONS:
+        return False
+    if word_start == line_start and len(word) == 1 and word.isupper():
+        return False  # section letters at the start of a line ("A. DEFINITIONS")
+    if word_start == line_start and CLAUSE_NUMBER_PATTERN.match(word):
+        return False  # clause numbers at the start of a line ("1. Termination", "iv. Fees")
+    return True
+
+
+def segment_spans(text):
+    # (start, end) character offsets of every sentence in text, found in a single pass
+    spans = []
+    sentence_start = 0
+    line_start = 0
+
+    for match in BOUNDARY_PATTERN.finditer(text):
+        if _is_boundary(text, match, line_start, sentence_start):
+            end = match.end("punct") if match.group("punct") is not None else match.start()
+            if text[sentence_start:end].strip():
+                spans.append((sentence_start, end))
+            sentence_start = match.end()
+
+        newline = text.rfind("\n", match.start(), match.end())
+        if newline != -1:
+            line_start = newline + 1
+
+    if text[sentence_start:].strip():
+        spans.append((sentence_start, len(text.rstrip())))
+
+    # Trim leading whitespace left over from the boundary scan
+    return [(start + len(text[start:end]) - len(text[start:end].lstrip()), end) for start, end in spans]
+
+
+def segment(text):
+    return [text[start:end] for start, end in segment_spans(text)]
@@ -0,0 +1,22 @@
+# Entry point of the summarizer worker processes started by jobs.JobScheduler. Kept
+# free of Qt and the app's imports: a spawned worker imports this module as its main
+# module instead of app.py, so it loads only the summarizers its jobs need
+
+
+def worker_main(connection):
+    # Run jobs one at a time, reporting progress and the outcome
+    while True:
+        try:
+            task = connection.recv()
+        except EOFError:
+            break
+        if task is None:
+            break
+        job_id, function, args, kwargs = task
+        progress = lambda stage: connection.send((job_id, "progress", stage))
+        try:
+            result = function(*args, progress=progress, **kwargs)
+        except Exception as e:
+            connection.send((job_id, "failed", str(e)))
+        else:
+            connection.send((job_id, "finished", result))
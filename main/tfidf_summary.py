@@ -1,119 +1,236 @@
-from nltk import sent_tokenize
 from sklearn.feature_extraction.text import TfidfVectorizer
 from sklearn.metrics.pairwise import cosine_similarity
-from numpy import argsort
-import networkx as nx
-from networkx import from_numpy_array, pagerank
-from nltk.tokenize import sent_tokenize
+from numpy import argsort, argpartition, asarray, abs as np_abs, full
+from scipy.sparse import csr_matrix, diags
+from segmenter import segment_spans
+from corpus_model import load_corpus_model
 import re
 
-# nltk.download('punkt_tab')
-
 
 # def preprocess_text(text):
 #     sentences = sent_tokenize(text)  # Split text into sentences
 #     return sentences
 
 
+URL_PATTERN = re.compile(r'http[s]?://\S+|www\.\S+')  # URLs, with or without a scheme
+
+
+def segment_text(text):
+    # Split text into sentences, keeping each sentence's (start, end) offsets in text
+    sentences, spans = [], []
+    for start, end in segment_spans(text):
+        # Remove hyperlinks
+        sentence = URL_PATTERN.sub('', text[start:end]).strip()
+        if sentence:
+            sentences.append(sentence)
+            spans.append((start, end))
+    return sentences, spans
+
+
 def preprocess_text(text):
-    # Remove hyperlinks
-    text = re.sub(r'http[s]?://\S+', '', text)  # Matches and removes URLs
-    text = re.sub(r'www\.\S+', '', text)  # Matches and removes URLs starting with www
-    
-    # Split text into sentences
-    sentences = sent_tokenize(text)
+    sentences, _ = segment_text(text)
     return sentences
 
-def tfidf_summarize(text, n=5):
-    sentences = preprocess_text(text)
-    
-    # Vectorize sentences using TF-IDF
-    vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(sentences)
-    
-    # Compute similarity between sentences
-    similarity_matrix = cosine_similarity(tfidf_matrix)
-    
+def sentence_centrality(tfidf_matrix):
+    # TF-IDF rows are L2-normalised, so the row sums of the cosine similarity
+    # matrix X @ X.T equal X @ (X.T @ 1): one sparse mat-vec, no n x n matrix
+    column_sums = asarray(tfidf_matrix.sum(axis=0)).ravel()
+    return asarray(tfidf_matrix @ column_sums).ravel()
+
+
+def top_n_indices(scores, n):
+    # Same result as argsort(scores)[-n:] (ascending by score), but only the
+    # top n are sorted after an O(len(scores)) partial selection
+    if n <= 0 or n >= len(scores):
+        return argsort(scores)[-n:]
+    top = argpartition(scores, -n)[-n:]
+    return top[argsort(scores[top])]
+
+
+class DocumentAnalysis:
+    # Segments, vectorizes and builds the similarity graph of a document once so
+    # that both rankers and the hybrid merge can share the work
+    def __init__(self, text, vectorizer=None):
+        self.sentences, self.spans = segment_text(text)
+
+        # Vectorize sentences using TF-IDF, with the corpus-fitted vectorizer when available
+        corpus_model = load_corpus_model() if vectorizer is None else None
+        if vectorizer is None and corpus_model is not None:
+            vectorizer = corpus_model.sentence_vectorizer
+
+        if vectorizer is not None:
+            self.vectorizer = vectorizer
+            self.tfidf_matrix = vectorizer.transform(self.sentences)
+        else:
+            self.vectorizer = TfidfVectorizer(stop_words='english')
+            self.tfidf_matrix = self.vectorizer.fit_transform(self.sentences)
+
+        self._graphs = {}
+        self._centrality = None
+
+    def similarity_graph(self, top_k=None, threshold=0.0):
+        key = (top_k, threshold)
+        if key not in self._graphs:
+            self._graphs[key] = similarity_graph(self.tfidf_matrix, top_k=top_k, threshold=threshold)
+        return self._graphs[key]
+
+    def centrality(self):
+        if self._centrality is None:
+            # Reuse the unpruned graph if TextRank already built it
+            if (None, 0.0) in self._graphs:
+                self._centrality = asarray(self._graphs[(None, 0.0)].sum(axis=1)).ravel()
+            else:
+                self._centrality = sentence_centrality(self.tfidf_matrix)
+        return self._centrality
+
+
+def tfidf_rank(analysis, n=5, centrality="sparse"):
     # Rank sentences based on the sum of their similarity scores
-    sentence_scores = similarity_matrix.sum(axis=1)
-    ranked_sentences = [sentences[i] for i in argsort(sentence_scores)[-n:]]
+    if centrality == "dense":
+        sentence_scores = cosine_similarity(analysis.tfidf_matrix).sum(axis=1)
+    else:
+        sentence_scores = analysis.centrality()
+    return list(top_n_indices(sentence_scores, n))
+
+
+def tfidf_summarize(text, n=5, centrality="sparse", analysis=None):
+    analysis = analysis or DocumentAnalysis(text)
+    ranked_sentences = [analysis.sentences[i] for i in tfidf_rank(analysis, n, centrality)]
     
     # Join top-ranked sentences to form the summary
     summary = ' '.join(ranked_sentences)
     return summary
 
 
-def textrank_summarize(text, n=5):
-    sentences = preprocess_text(text)
-    
-    # Vectorize sentences using TF-IDF
-    vectorizer = TfidfVectorizer(stop_words='english')
-    tfidf_matrix = vectorizer.fit_transform(sentences)
+def answer_question(analysis, question, n=3, min_score=0.02):
+    # Offline answer: the n sentences most similar to the question (TF-IDF cosine),
+    # best first, as (sentence, (start, end)) with offsets into the analysed text
+    query = analysis.vectorizer.transform([question])
+    if not query.nnz or not analysis.tfidf_matrix.shape[0]:
+        return []
+    scores = (analysis.tfidf_matrix @ query.T).toarray().ravel()
+
+    # Short sentences sharing one common word score high on cosine alone, so weight
+    # by the share of the question's terms each sentence contains
+    matched = ((analysis.tfidf_matrix > 0) @ (query > 0).T.astype(float)).toarray().ravel()
+    scores *= matched / query.nnz
+    return [(analysis.sentences[i], analysis.spans[i])
+            for i in top_n_indices(scores, n)[::-1] if scores[i] > min_score]
+
+
+def similarity_graph(tfidf_matrix, top_k=None, threshold=0.0):
+    # Cosine similarity kept sparse: X @ X.T only stores pairs of sentences that
+    # share a term, and optional pruning keeps each row's k strongest edges
+    # and/or edges above a threshold
+    graph = csr_matrix(tfidf_matrix @ tfidf_matrix.T)
+    if threshold > 0:
+        graph.data[graph.data < threshold] = 0
+        graph.eliminate_zeros()
+
+    if top_k is not None:
+        rows, cols, vals = [], [], []
+        for i in range(graph.shape[0]):
+            start, end = graph.indptr[i], graph.indptr[i + 1]
+            keep = argsort(graph.data[start:end])[-top_k:] + start
+            cols.extend(graph.indices[keep])
+            vals.extend(graph.data[keep])
+            rows.extend([i] * len(keep))
+        graph = csr_matrix((vals, (rows, cols)), shape=graph.shape)
+        # Keep the graph undirected, as from_numpy_array did
+        graph = graph.maximum(graph.T).tocsr()
+
+    return graph
+
+
+def sparse_pagerank(graph, alpha=0.85, tol=1.0e-6, max_iter=100):
+    # Weighted PageRank by power iteration, equivalent to networkx.pagerank:
+    # dangling sentences (no edges) spread their rank uniformly
+    n = graph.shape[0]
+    if n == 0:
+        return full(0, 0.0)
+
+    out_weight = asarray(graph.sum(axis=1)).ravel()
+    dangling = out_weight == 0
+    inverse_weight = 1.0 / out_weight.clip(min=1e-300)
+    inverse_weight[dangling] = 0
+    transition = (diags(inverse_weight) @ graph).T.tocsr()
+
+    scores = full(n, 1.0 / n)
+    for _ in range(max_iter):
+        previous = scores
+        scores = alpha * (transition @ previous) + (alpha * previous[dangling].sum() + 1 - alpha) / n
+        if np_abs(scores - previous).sum() < n * tol:
+            break
+
+    return scores
+
+
+def textrank_rank(analysis, n=5, top_k=None, threshold=0.0, tol=1.0e-6, max_iter=100):
+    # Rank sentences with TextRank over the shared similarity graph
+    graph = analysis.similarity_graph(top_k=top_k, threshold=threshold)
+    scores = sparse_pagerank(graph, tol=tol, max_iter=max_iter)
     
-    # Compute similarity matrix
-    similarity_matrix = cosine_similarity(tfidf_matrix)
-    
-    # Build graph and rank sentences with TextRank
-    nx_graph = from_numpy_array(similarity_matrix)
-    scores = pagerank(nx_graph)
-    
-    # Rank sentences by score
-    ranked_sentences = sorted(((scores[i], s) for i, s in enumerate(sentences)), reverse=True)
+    sentences = analysis.sentences
+    ranked = sorted(range(len(sentences)), key=lambda i: (scores[i], sentences[i]), reverse=True)
+    return ranked[:n]
+
+
+def textrank_summarize(text, n=5, top_k=None, threshold=0.0, tol=1.0e-6, max_iter=100, analysis=None):
+    analysis = analysis or DocumentAnalysis(text)
+    ranked = textrank_rank(analysis, n, top_k=top_k, threshold=threshold, tol=tol, max_iter=max_iter)
     
     # Select top-ranked sentences for the summary
-    summary = ' '.join([sentence for _, sentence in ranked_sentences[:n]])
+    summary = ' '.join([analysis.sentences[i] for i in ranked])
     return summary
 
 
-def hybrid_summary(tfidf_summary, textrank_summary, threshold=0.5):
-    combined_summary = []
-    tfidf_sentences = tfidf_summary.split('.')
-    textrank_sentences = textrank_summary.split('.')
-    
-    vectorizer = TfidfVectorizer().fit(tfidf_sentences + textrank_sentences)
-    tfidf_vectors = vectorizer.transform(tfidf_sentences)
-    textrank_vectors = vectorizer.transform(textrank_sentences)
-    
-    for i, tfidf_vec in enumerate(tfidf_vectors):
-        for j, textrank_vec in enumerate(textrank_vectors):
-            similarity = cosine_similarity(tfidf_vec, textrank_vec)[0, 0]
-            if similarity >= threshold:
-                combined_summary.append(tfidf_sentences[i].strip())
-                break
-    
-    unique_textrank = [sent.strip() for i, sent in enumerate(textrank_sentences) 
-                       if not any(cosine_similarity(textrank_vectors[i], tfidf_vec)[0, 0] >= threshold 
-                                  for tfidf_vec in tfidf_vectors)]
-    
-    combined_summary.extend(unique_textrank)
-    return '. '.join(combined_summary) + '.'
+def hybrid_summary(analysis, tfidf_indices, textrank_indices, threshold=0.5):
+    # Merge the two rankings by sentence index: keep TF-IDF picks that TextRank
+    # corroborates, then add the TextRank picks no TF-IDF pick covers
+    tfidf_indices = list(tfidf_indices)
+    textrank_indices = list(textrank_indices)
+    if not tfidf_indices and not textrank_indices:
+        return ''
+
+    # Cross-similarity of every TF-IDF pick against every TextRank pick in one product
+    tfidf_matrix = analysis.tfidf_matrix
+    similar = (tfidf_matrix[tfidf_indices] @ tfidf_matrix[textrank_indices].T).toarray() >= threshold
+
+    combined_summary = [i for i, keep in zip(tfidf_indices, similar.any(axis=1)) if keep]
+    combined_summary.extend(j for j, covered in zip(textrank_indices, similar.any(axis=0)) if not covered)
+    return ' '.join(analysis.sentences[i].strip() for i in combined_summary)
 
 def read_text_file(filepath):
     with open(filepath, 'r', encoding='utf-8') as file:
         return file.read()
 
-def st_generate_summary(text, reducing_factor = 6):
+def st_generate_summary(text, reducing_factor = 6, progress=None):
+    # progress, if given, is called with a description of each stage
+    progress = progress or (lambda stage: None)
     n = len(text.split(". "))// reducing_factor
-    tfidf_summary = tfidf_summarize(text, n)
-    textrank_summary = textrank_summarize(text, n)
-
-    # for sentence in textrank_summary.split(". "):
-    #     print(sentence)
-
-    final_summary = hybrid_summary(tfidf_summary, textrank_summary)
+    progress("Splitting and vectorizing sentences")
+    analysis = DocumentAnalysis(text)
+    progress("Ranking sentences by TF-IDF")
+    tfidf_indices = tfidf_rank(analysis, n)
+    progress("Ranking sentences by TextRank")
+    textrank_indices = textrank_rank(analysis, n)
+
+    progress("Merging the rankings")
+    final_summary = hybrid_summary(analysis, tfidf_indices, textrank_indices)
     return final_summary
 
 #-----------------------------------------------------------------------------------------------------------------------
 # text = read_text_file(".//dataset//apple.txt")
 
 # n = len(text.split(". "))//6
-# tfidf_summary = tfidf_summarize(text, n)
-# textrank_summary = textrank_summarize(text, n)
+# analysis = DocumentAnalysis(text)
+# tfidf_indices = tfidf_rank(analysis, n)
+# textrank_indices = textrank_rank(analysis, n)
 
-# # for sentence in textrank_summary.split(". "):
-# #     print(sentence)
+# # for i in textrank_indices:
+# #     print(analysis.sentences[i])
 
-# final_summary = hybrid_summary(tfidf_summary, textrank_summary)
+# final_summary = hybrid_summary(analysis, tfidf_indices, textrank_indices)
 
 
 
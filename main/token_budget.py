@@ -0,0 +1,114 @@
+from regex import compile as compile_pattern
+
+from segmenter import segment_spans
+
+# Context window of each model, in tokens
+MODEL_CONTEXT = {
+    "llama3-8b-8192": 8192,
+    "llama-3.1-8b-instant": 131072,
+    "gemma2-9b-it": 8192,
+}
+DEFAULT_CONTEXT = 8192
+
+MESSAGE_OVERHEAD = 4   # chat template tokens around every message
+REPLY_OVERHEAD = 3     # tokens that prime the assistant reply
+SAFETY_MARGIN = 1.1    # estimates stay within about 10% of the real count
+
+# Llama 3 pre-tokenizer: every piece it produces is at least one token
+PRETOKEN_PATTERN = compile_pattern(
+    r"(?i:'s|'t|'re|'ve|'m|'ll|'d)|[^\r\n\p{L}\p{N}]?\p{L}+|\p{N}{1,3}"
+    r"| ?[^\s\p{L}\p{N}]+[\r\n]*|\s*[\r\n]+|\s+(?!\S)|\s+"
+)
+# Pieces that the BPE vocabulary splits further
+EXTRA_PATTERN = compile_pattern(
+    r"(?P<upper>\p{Lu}{4,})\b|(?P<long>\p{L}{9,})|(?P<punct>[^\s\p{L}\p{N}]{4,})"
+    r"|(?P<nbsp>\xa0)|(?P<foreign>[^\p{Latin}\p{Common}\p{Inherited}]+)"
+)
+# Extra tokens per character beyond the threshold of each kind of piece, fitted on the
+# Sample T&Cs (see benchmarks/token_estimator_calibration.py)
+EXTRA_COST = {"upper": (3, 0.3), "long": (8, 0.1), "punct": (3, 0.5), "nbsp": (0, 1.0), "foreign": (0, 0.5)}
+
+
+def count_tokens(text):
+    # Fast offline estimate of the Llama 3 / Gemma 2 token count of text
+    tokens = len(PRETOKEN_PATTERN.findall(text))
+    for match in EXTRA_PATTERN.finditer(text):
+        threshold, per_char = EXTRA_COST[match.lastgroup]
+        extra = len(match.group()) - threshold
+        if match.lastgroup == "punct":
+            extra = min(extra, 4)
+        tokens += extra * per_char
+    return int(tokens) + 1
+
+
+def count_message_tokens(messages):
+    return sum(count_tokens(message["content"]) + MESSAGE_OVERHEAD for message in messages) + REPLY_OVERHEAD
+
+
+def request_tokens(messages, max_tokens):
+    # Tokens a request can use in total: the prompt plus the whole completion budget
+    return int(count_message_tokens(messages) * SAFETY_MARGIN) + max_tokens
+
+
+def context_window(model):
+    return MODEL_CONTEXT.get(model, DEFAULT_CONTEXT)
+
+
+def input_budget(model, system_prompt, max_tokens, request_limit=None):
+    # Tokens left for the user input once the system prompt and completion are reserved;
+    # request_limit caps the whole request (e.g. a tokens-per-minute quota)
+    limit = context_window(model) if request_limit is None else min(context_window(model), request_limit)
+    reserved = count_message_tokens([{"role": "system", "content": system_prompt},
+                                     {"role": "user", "content": ""}])
+    return max(0, int((limit - max_tokens) / SAFETY_MARGIN) - reserved)
+
+
+def completion_budget(model, messages, max_tokens, request_limit=None):
+    # Largest max_tokens (up to max_tokens) that still fits after the prompt
+    limit = context_window(model) if request_limit is None else min(context_window(model), request_limit)
+    return max(0, min(max_tokens, limit - int(count_message_tokens(messages) * SAFETY_MARGIN)))
+
+
+def truncate_to_tokens(text, max_tokens):
+    # Longest prefix of text estimated to fit in max_tokens
+    total = count_tokens(text)
+    if total <= max_tokens:
+        return text
+
+    # Cut at the average characters per token, then shrink until the prefix fits
+    end = int(len(text) * max_tokens / total)
+    while end > 0 and count_tokens(text[:end]) > max_tokens:
+        end = int(end * 0.95)
+    return text[:end]
+
+
+def chunk_spans(text, limit):
+    # (start, end) offsets of consecutive clauses grouped into chunks of at most
+    # limit tokens; a single clause longer than limit is cut at the limit
+    chunks = []
+    chunk_start = chunk_end = None
+    chunk_tokens = 0
+
+    for start, end in segment_spans(text):
+        tokens = count_tokens(text[start:end])
+        while tokens > limit:
+            if chunk_start is not None:
+                chunks.append((chunk_start, chunk_end))
+                chunk_start = None
+            piece_end = start + max(len(truncate_to_tokens(text[start:end], limit)), 1)
+            chunks.append((start, piece_end))
+            start = piece_end
+            tokens = count_tokens(text[start:end])
+
+        if chunk_start is not None and chunk_tokens + tokens > limit:
+            chunks.append((chunk_start, chunk_end))
+            chunk_start = None
+        if chunk_start is None:
+            chunk_start = start
+            chunk_tokens = 0
+        chunk_end = end
+        chunk_tokens += tokens
+
+    if chunk_start is not None:
+        chunks.append((chunk_start, chunk_end))
+    return chunks
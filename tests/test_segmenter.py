@@ -0,0 +1,32 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "main"))
+
+from segmenter import segment
+
+
+def test_no_ends_a_sentence():
+    assert segment("If asked whether we share data, the answer is no. You may opt out at any time.") == [
+        "If asked whether we share data, the answer is no.",
+        "You may opt out at any time.",
+    ]
+    assert segment("We said no. Then we left.") == ["We said no.", "Then we left."]
+
+
+def test_no_before_a_number_does_not():
+    assert segment("See Clause No. 5 for details. Nos. 3-4 apply too.") == [
+        "See Clause No. 5 for details.",
+        "Nos. 3-4 apply too.",
+    ]
+
+
+def test_single_letter_only_holds_at_the_start_of_a_line():
+    assert segment("Fees are listed in Schedule A. The Service may change.") == [
+        "Fees are listed in Schedule A.",
+        "The Service may change.",
+    ]
+    assert segment("A. DEFINITIONS\nThe Service is provided as is.") == [
+        "A. DEFINITIONS",
+        "The Service is provided as is.",
+    ]